@@ -0,0 +1,184 @@
+import json
+import re
+from dataclasses import dataclass, field, asdict
+
+SENTIMENT_LABELS = ("positive", "neutral", "negative")
+
+# Labels models sometimes return instead of the requested ones
+LABEL_ALIASES = {
+    "bullish": "positive", "正面": "positive", "利多": "positive", "看多": "positive",
+    "bearish": "negative", "負面": "negative", "利空": "negative", "看空": "negative",
+    "mixed": "neutral", "中立": "neutral", "中性": "neutral"
+}
+
+
+def _as_list(value):
+    if value is None or value == "":
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(v).strip() for v in value if v is not None and str(v).strip()]
+    if isinstance(value, str):
+        return [part.strip() for part in re.split(r"[,，、;；]", value) if part.strip()]
+    return [str(value)]
+
+
+def _as_float(value, default):
+    try:
+        return float(str(value).strip().rstrip("%"))
+    except (TypeError, ValueError):
+        return default
+
+
+@dataclass
+class SentimentResult:
+    label: str = "neutral"
+    score: float = 0.0
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Validate a raw model reply: unknown labels become "neutral",
+        percentages are rescaled and the score is clamped to 0.0-1.0.
+        """
+        data = data if isinstance(data, dict) else {}
+        label = str(data.get("label", "neutral")).strip().lower()
+        label = LABEL_ALIASES.get(label, label)
+        if label not in SENTIMENT_LABELS:
+            label = "neutral"
+        score = _as_float(data.get("score"), 0.5)
+        if score > 1.0:
+            score /= 100.0
+        return cls(label=label, score=min(max(score, 0.0), 1.0))
+
+    def as_tuple(self):
+        return self.label, self.score
+
+
+@dataclass
+class ExtractedInfo:
+    company_name: list = field(default_factory=list)
+    stock_code: list = field(default_factory=list)
+    financial_data: dict = field(default_factory=dict)
+    events: list = field(default_factory=list)
+    time_info: str = ""
+    # Canonical tickers resolved from stock_code / company_name by the entity index
+    tickers: list = field(default_factory=list)
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Coerce a raw model reply into the expected field types
+        (a single string becomes a one-element list, missing fields get defaults).
+        """
+        data = data if isinstance(data, dict) else {}
+        financial_data = data.get("financial_data")
+        if not isinstance(financial_data, dict):
+            financial_data = {"value": financial_data} if financial_data else {}
+        time_info = data.get("time_info")
+        if isinstance(time_info, (list, tuple)):
+            time_info = ", ".join(str(t) for t in time_info)
+        return cls(
+            company_name=_as_list(data.get("company_name")),
+            stock_code=_as_list(data.get("stock_code")),
+            financial_data=financial_data,
+            events=_as_list(data.get("events")) if not isinstance(data.get("events"), str) else [data["events"]],
+            time_info=str(time_info) if time_info else "",
+            tickers=_as_list(data.get("tickers"))
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def _straighten_quotes(text):
+    """
+    Replace smart quotes that are used as JSON string delimiters (“label”: “positive”).
+    Smart quotes inside string literals are part of the text and are kept.
+    """
+    out = []
+    closers = None
+    escaped = False
+    for char in text:
+        if closers is None:
+            if char in '"“”':
+                # A string opened with a smart quote may be closed with either kind
+                closers = '"' if char == '"' else '"”'
+                char = '"'
+        elif escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in closers:
+            closers = None
+            char = '"'
+        out.append(char)
+    return "".join(out)
+
+
+def _repair_truncated(text):
+    """
+    Close an unterminated string and any open brackets, and drop trailing commas.
+    """
+    stack = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r"[,:\s]+$", "", text)
+    text += "".join(reversed(stack))
+    return re.sub(r",\s*([}\]])", r"\1", text)
+
+
+def parse_json_lenient(text):
+    """
+    Parse JSON from an LLM reply that may be wrapped in Markdown fences or prose,
+    contain trailing commas or smart quotes, or be cut off mid-object.
+    """
+    if text is None:
+        raise ValueError("empty reply")
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    fenced = re.search(r"```(?:json)?\s*(.*?)(?:```|$)", text, re.S)
+    if fenced:
+        text = fenced.group(1)
+    text = _straighten_quotes(text.strip())
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("no JSON object found in reply")
+    text = text[min(starts):]
+
+    decoder = json.JSONDecoder()
+    candidates = [text, re.sub(r",\s*([}\]])", r"\1", text), _repair_truncated(text)]
+    # A reply cut inside a key or value: drop the incomplete member and close the rest
+    cuts = [i for i, char in enumerate(text) if char in ",{["][::-1][:20]
+    candidates += [_repair_truncated(text[:i + (text[i] != ",")]) for i in cuts]
+    for candidate in candidates:
+        try:
+            value, _ = decoder.raw_decode(candidate)
+            return value
+        except ValueError:
+            continue
+    raise ValueError("could not repair JSON reply")
@@ -0,0 +1,195 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from analysis_models import SentimentResult
+
+ANALYSIS_DB_PATH = os.getenv("ANALYSIS_DB_PATH", os.path.join(".cache", "analyses.sqlite"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL DEFAULT '',
+    url TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    sentiment_label TEXT,
+    sentiment_score REAL,
+    result TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS analysis_tickers (
+    analysis_id INTEGER NOT NULL REFERENCES analyses(id) ON DELETE CASCADE,
+    ticker TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analysis_tickers_ticker ON analysis_tickers (ticker, analysis_id);
+CREATE INDEX IF NOT EXISTS analysis_tickers_analysis ON analysis_tickers (analysis_id);
+"""
+
+# Indexes that need the owner column, created after migrating older databases
+OWNER_INDEXES = """
+DROP INDEX IF EXISTS analyses_url;
+DROP INDEX IF EXISTS analyses_created;
+DROP INDEX IF EXISTS analyses_sentiment;
+CREATE UNIQUE INDEX IF NOT EXISTS analyses_owner_url ON analyses (owner, url);
+CREATE INDEX IF NOT EXISTS analyses_owner_created ON analyses (owner, created_at, id);
+CREATE INDEX IF NOT EXISTS analyses_owner_sentiment ON analyses (owner, sentiment_label, created_at, id);
+"""
+
+
+class AnalysisStore:
+    """
+    Persistent history of complete analysis results in SQLite, indexed by URL,
+    time, ticker and sentiment so the history sidebar can page through tens of
+    thousands of rows and reopen any result without refetching or calling the LLM.
+
+    Every row belongs to an owner (a session or user id) and is only visible to
+    that owner; re-analyzing a URL replaces the owner's previous row for it.
+    """
+
+    def __init__(self, path=ANALYSIS_DB_PATH):
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+            self._conn.executescript(OWNER_INDEXES)
+            self._conn.commit()
+
+    def _migrate(self):
+        """
+        Bring databases written before per-owner history up to date. Their rows
+        keep the empty owner, which no session uses, so they are never shown.
+        """
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(analyses)")}
+        if "owner" not in columns:
+            self._conn.execute("ALTER TABLE analyses ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+        # Keep only the newest row per (owner, url) so the unique index can be built
+        self._conn.execute(
+            "DELETE FROM analyses WHERE id NOT IN (SELECT MAX(id) FROM analyses GROUP BY owner, url)"
+        )
+
+    @staticmethod
+    def _index_fields(results):
+        """
+        Indexed columns of a dashboard results dict {text, sentiment, info, advice}.
+        """
+        label, score = results.get("sentiment") or ("neutral", 0.0)
+        # Dashboard results carry the zh display label; index the canonical one
+        sentiment = SentimentResult.from_dict({"label": label, "score": score})
+        info = results.get("info") or {}
+        tickers = info.get("tickers") or info.get("stock_code") or []
+        return sentiment, sorted({str(t).strip().upper() for t in tickers if str(t).strip()})
+
+    def save(self, owner, url, results):
+        """
+        Store a complete analysis for owner, replacing their earlier analysis of
+        the same URL and moving it to the top of the history; returns its id.
+        """
+        sentiment, tickers = self._index_fields(results)
+        with self._lock:
+            analysis_id = self._conn.execute(
+                "INSERT INTO analyses (owner, url, created_at, sentiment_label, sentiment_score, result) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (owner, url) DO UPDATE SET created_at = excluded.created_at, "
+                "sentiment_label = excluded.sentiment_label, sentiment_score = excluded.sentiment_score, "
+                "result = excluded.result RETURNING id",
+                (owner, url, time.time(), sentiment.label, sentiment.score, json.dumps(results, ensure_ascii=False))
+            ).fetchone()[0]
+            self._conn.execute("DELETE FROM analysis_tickers WHERE analysis_id = ?", (analysis_id,))
+            self._conn.executemany(
+                "INSERT INTO analysis_tickers (analysis_id, ticker) VALUES (?, ?)",
+                [(analysis_id, ticker) for ticker in tickers]
+            )
+            self._conn.commit()
+        return analysis_id
+
+    def update(self, owner, analysis_id, results):
+        """
+        Replace the stored results of an owner's analysis (e.g. once streamed advice has finished).
+        """
+        sentiment, tickers = self._index_fields(results)
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE analyses SET sentiment_label = ?, sentiment_score = ?, result = ? WHERE id = ? AND owner = ?",
+                (sentiment.label, sentiment.score, json.dumps(results, ensure_ascii=False), analysis_id, owner)
+            )
+            if cursor.rowcount == 0:
+                return
+            self._conn.execute("DELETE FROM analysis_tickers WHERE analysis_id = ?", (analysis_id,))
+            self._conn.executemany(
+                "INSERT INTO analysis_tickers (analysis_id, ticker) VALUES (?, ?)",
+                [(analysis_id, ticker) for ticker in tickers]
+            )
+            self._conn.commit()
+
+    @staticmethod
+    def _load(row):
+        if row is None:
+            return None
+        results = json.loads(row["result"])
+        if results.get("sentiment"):
+            results["sentiment"] = tuple(results["sentiment"])
+        return {"id": row["id"], "url": row["url"], "created_at": row["created_at"], "results": results}
+
+    def get(self, owner, analysis_id):
+        """
+        Returns: dict {id, url, created_at, results} or None if owner has no such analysis
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM analyses WHERE id = ? AND owner = ?", (analysis_id, owner)
+            ).fetchone()
+        return self._load(row)
+
+    def get_latest(self, owner, url):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM analyses WHERE owner = ? AND url = ?", (owner, url)
+            ).fetchone()
+        return self._load(row)
+
+    @staticmethod
+    def _filters(owner, ticker=None, sentiment=None, since=None):
+        clauses, params = ["a.owner = ?"], [owner]
+        if ticker:
+            clauses.append("a.id IN (SELECT analysis_id FROM analysis_tickers WHERE ticker = ?)")
+            params.append(ticker.upper())
+        if sentiment:
+            clauses.append("a.sentiment_label = ?")
+            params.append(sentiment)
+        if since is not None:
+            clauses.append("a.created_at >= ?")
+            params.append(since)
+        return " WHERE " + " AND ".join(clauses), params
+
+    def list_recent(self, owner, limit=20, before=None, ticker=None, sentiment=None, since=None):
+        """
+        One page of owner's history, newest first, without the stored result payloads.
+        before: (created_at, id) of the last row of the previous page, or None for the first page
+        Returns: list of dicts {id, url, created_at, sentiment_label, sentiment_score}
+        """
+        where, params = self._filters(owner, ticker, sentiment, since)
+        if before is not None:
+            # Keyset pagination: seek past the previous page instead of counting rows with OFFSET
+            where += " AND (a.created_at, a.id) < (?, ?)"
+            params += list(before)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT a.id, a.url, a.created_at, a.sentiment_label, a.sentiment_score "
+                f"FROM analyses a{where} ORDER BY a.created_at DESC, a.id DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def count(self, owner, ticker=None, sentiment=None, since=None):
+        where, params = self._filters(owner, ticker, sentiment, since)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM analyses a{where}", params).fetchone()[0]
@@ -1,8 +1,13 @@
 import streamlit as st
-from financial_analyzer import FinancialAnalyzer
+from financial_analyzer import FinancialAnalyzer, AdviceStreamError, SENTIMENT_LABELS_ZH
+from async_analyzer import SyncFinancialAnalyzer
+from analysis_store import AnalysisStore
+from sentiment_timeseries import SentimentTimeSeries, latest_rollup
+from instrumentation import get_instrumentation
 import plotly.graph_objects as go
 import time
 import os
+import uuid
 
 st.set_page_config(page_title="Financial Insights AI", layout="wide", page_icon="⚡")
 print("🚀 Starting Financial Insights AI - Version 14e4f38 (Fixing Deployment)")
@@ -147,14 +152,90 @@ def set_url_and_analyze(url):
 def clear_results():
     if 'results' in st.session_state:
         del st.session_state['results']
+    st.session_state.pop('results_id', None)
     st.session_state['main_url_input'] = ""
 
+# Helper function to show the per-stage breakdown of one analysis request
+def render_trace(trace):
+    totals = trace.totals()
+    st.caption(
+        f"⏱️ 總耗時 {totals['duration_ms'] / 1000:.2f} 秒｜下載 {totals['bytes'] / 1024:.1f} KB｜"
+        f"Token {totals['prompt_tokens']} + {totals['completion_tokens']}｜快取命中 {totals['cache_hits']}｜錯誤 {totals['errors']}"
+    )
+    st.dataframe([
+        {
+            "階段": event['stage'],
+            "上層": event['parent'] or "",
+            "耗時 (ms)": event['duration_ms'],
+            "位元組": event['bytes'],
+            "輸入 Token": event['prompt_tokens'],
+            "輸出 Token": event['completion_tokens'],
+            "快取": event['cache'] or "",
+            "錯誤": event['error'] or ""
+        }
+        for event in trace.events
+    ], use_container_width=True, hide_index=True)
+
+# Persistent analysis history (survives restarts); each visitor only sees their own rows
+@st.cache_resource
+def get_analysis_store():
+    return AnalysisStore()
+
+analysis_store = get_analysis_store()
+
+# "session" keeps history private to the browser that made it; "shared" opts into one history for all visitors
+ANALYSIS_HISTORY_SCOPE = os.getenv("ANALYSIS_HISTORY_SCOPE", "session")
+
+def get_history_owner():
+    if ANALYSIS_HISTORY_SCOPE == "shared":
+        return "shared"
+    if 'history_owner' not in st.session_state:
+        # Keep the random id in the URL so reloading or bookmarking the page finds the same history
+        st.session_state['history_owner'] = st.query_params.get("history") or uuid.uuid4().hex
+    st.query_params["history"] = st.session_state['history_owner']
+    return st.session_state['history_owner']
+
+history_owner = get_history_owner()
+
+# Per-ticker sentiment observations (columnar Parquet store) for the trend panel
+@st.cache_resource
+def get_sentiment_series():
+    return SentimentTimeSeries()
+
+sentiment_series = get_sentiment_series()
+HISTORY_PAGE_SIZE = 10
+
+# The trend rollup only changes when observations are added: key it on the store's
+# part files and buffer size so homepage renders reuse it instead of rescanning Parquet
+@st.cache_data(ttl=3600, max_entries=8, show_spinner=False)
+def load_sentiment_trend(version, since):
+    return sentiment_series.rollup(freq="1D", window=7, since=since)
+
+# Helper function to reopen a stored analysis without fetching or calling the LLM again
+def load_history(analysis_id):
+    record = analysis_store.get(history_owner, analysis_id)
+    if record:
+        st.session_state['results'] = record['results']
+        st.session_state.pop('advice_error', None)
+        st.session_state['results_id'] = record['id']
+        st.session_state['main_url_input'] = record['url']
+
 
 
 # Sidebar for Settings
 with st.sidebar:
     st.header("⚙️ 設定")
     user_api_key = st.text_input("OpenAI API Key", type="password", placeholder="sk-proj-...")
+    sentiment_provider = st.radio(
+        "情緒模型",
+        ["OpenAI GPT", "本地模型 (免費、快速)"],
+        help="本地模型在伺服器 CPU 上執行情緒分析，不需呼叫 API"
+    )
+    analysis_mode = st.radio(
+        "分析模式",
+        ["單次請求 (節省 Token)", "平行處理 (逐步顯示)"],
+        help="單次請求：一次 API 呼叫完成所有分析；平行處理：情緒與實體同時分析並逐步回報進度，投資策略即時串流顯示"
+    )
     st.markdown("---")
     st.markdown("### 關於")
     st.markdown("此系統使用 OpenAI GPT 模型進行全方位的情緒分析與深度解讀。")
@@ -162,30 +243,54 @@ with st.sidebar:
     # History Section
     st.markdown("---")
     st.header("📜 歷史記錄")
-    if 'history' not in st.session_state:
-        st.session_state['history'] = []
+    history_total = analysis_store.count(history_owner)
+    history_pages = max(1, -(-history_total // HISTORY_PAGE_SIZE))
+    # Keyset cursors: the (created_at, id) of the last row of every page before the current one
+    history_cursors = st.session_state.setdefault('history_cursors', [])
+    del history_cursors[history_pages - 1:]
+    history_page = len(history_cursors)
+    
+    # Display one page of history, newest first
+    history_rows = analysis_store.list_recent(
+        history_owner, limit=HISTORY_PAGE_SIZE, before=history_cursors[-1] if history_cursors else None
+    )
+    for record in history_rows:
+        label_zh = SENTIMENT_LABELS_ZH.get(record['sentiment_label'], record['sentiment_label'])
+        st.button(f"🔗 {record['url'][:30]}... ({label_zh})", key=f"hist_{record['id']}", help=record['url'], on_click=load_history, args=(record['id'],))
     
-    # Display history in reverse order (newest first)
-    # Display history in reverse order (newest first)
-    for i, url in enumerate(reversed(st.session_state['history'])):
-        st.button(f"🔗 {url[:30]}...", key=f"hist_{i}", help=url, on_click=set_url_and_analyze, args=(url,))
+    if history_total > HISTORY_PAGE_SIZE:
+        prev_col, next_col = st.columns(2)
+        if prev_col.button("◀", key="hist_prev", disabled=history_page == 0):
+            history_cursors.pop()
+            st.rerun()
+        if next_col.button("▶", key="hist_next", disabled=history_page >= history_pages - 1 or not history_rows):
+            history_cursors.append((history_rows[-1]['created_at'], history_rows[-1]['id']))
+            st.rerun()
+        st.caption(f"第 {history_page + 1} / {history_pages} 頁（共 {history_total} 筆）")
 
 # Initialize Analyzer
+# "async" runs the network I/O of all sessions on one shared event loop; "sync" blocks a thread per call
+ANALYZER_BACKEND = os.getenv("ANALYZER_BACKEND", "async")
+
 @st.cache_resource
-def get_analyzer_v3(api_key_input):
+def get_analyzer_v3(api_key_input, model_provider="openai"):
     import os # Defensive import
     print("DEBUG: get_analyzer_v3 called with input:", api_key_input)
     # Priority: User Input > Environment Variable
     api_key = api_key_input or os.getenv("OPENAI_API_KEY")
-    return FinancialAnalyzer(api_key=api_key)
+    analyzer_class = SyncFinancialAnalyzer if ANALYZER_BACKEND == "async" else FinancialAnalyzer
+    return analyzer_class(api_key=api_key, model_provider=model_provider)
 
-analyzer = get_analyzer_v3(user_api_key)
+analyzer = get_analyzer_v3(user_api_key, "local" if sentiment_provider.startswith("本地") else "openai")
 
-# Market Overview Ticker
-if "market_data" not in st.session_state:
-    st.session_state["market_data"] = analyzer.fetch_market_data()
+with st.sidebar:
+    cache_stats = analyzer.cache_stats()
+    with st.expander("📊 效能指標 (Prometheus)"):
+        st.code(get_instrumentation().to_prometheus(), language="text")
+    st.caption(f"🗄️ 分析快取：命中 {cache_stats['hits']} / 未命中 {cache_stats['misses']}（共 {cache_stats['size']} 筆，重複新聞 {cache_stats['duplicates']} 篇）")
 
-market_data = st.session_state["market_data"]
+# Market Overview Ticker (cached process-wide inside the analyzer, shared by all sessions)
+market_data = analyzer.fetch_market_data()
 if market_data:
     cols = st.columns(len(market_data))
     for i, (name, data) in enumerate(market_data.items()):
@@ -227,33 +332,42 @@ if analyze_btn:
     if not url_input:
         st.warning("請輸入新聞連結")
     else:
-        with st.status("正在分析...", expanded=True) as status:
+        with get_instrumentation().trace(url_input) as trace, st.status("正在分析...", expanded=True) as status:
             st.write("🌐 正在讀取新聞內容...")
             news_text = analyzer.fetch_news_from_url(url_input)
             
             if news_text.startswith("Error"):
                 st.error(news_text)
+                render_trace(trace)
                 status.update(label="分析失敗", state="error")
             else:
-                st.write("🧠 神經網絡處理中...")
-                sentiment_label, sentiment_score = analyzer.analyze_sentiment(news_text)
+                if analysis_mode.startswith("平行"):
+                    st.write("🧠 正在平行分析情緒與關鍵實體...")
+                    stage_messages = {
+                        "sentiment": "✅ 情緒分析完成",
+                        "info": "✅ 關鍵實體萃取完成"
+                    }
+                    # Advice is streamed into the dashboard card below instead of waited for here
+                    analysis = analyzer.analyze_pipeline(
+                        news_text,
+                        progress_callback=lambda stage, _: st.write(stage_messages[stage]),
+                        include_advice=False
+                    )
+                    analysis['advice'] = None
+                else:
+                    st.write("🧠 正在分析情緒、萃取關鍵實體並合成投資策略...")
+                    analysis = analyzer.analyze_all(news_text)
+                sentiment_label, sentiment_score = analysis['sentiment']
+                info = analysis['info']
+                advice = analysis['advice']
                 
                 # Translate Sentiment Label
-                sentiment_map = {
-                    "positive": "正面",
-                    "negative": "負面",
-                    "neutral": "中立"
-                }
-                sentiment_label_zh = sentiment_map.get(sentiment_label, sentiment_label)
-                
-                st.write("🔍 正在萃取關鍵實體...")
-                info = analyzer.extract_info(news_text)
-                
-                st.write("💡 正在合成投資策略...")
-                advice = analyzer.generate_advice(news_text, sentiment_label_zh)
+                sentiment_label_zh = SENTIMENT_LABELS_ZH.get(sentiment_label, sentiment_label)
                 
+                render_trace(trace)
                 status.update(label="分析完成", state="complete")
                 
+                st.session_state.pop('advice_error', None)
                 st.session_state['results'] = {
                     'text': news_text,
                     'sentiment': (sentiment_label_zh, sentiment_score),
@@ -261,9 +375,9 @@ if analyze_btn:
                     'advice': advice
                 }
                 
-                # Add to history if not exists
-                if url_input not in st.session_state['history']:
-                    st.session_state['history'].append(url_input)
+                # Persist the complete result so history can reopen it offline
+                st.session_state['results_id'] = analysis_store.save(history_owner, url_input, st.session_state['results'])
+                sentiment_series.record(info.get('tickers') or info.get('stock_code', []), sentiment_label, sentiment_score, url=url_input)
 
 # Results Dashboard
 if 'results' in st.session_state:
@@ -318,7 +432,24 @@ if 'results' in st.session_state:
         # Investment Advice Card
         st.markdown('<div class="info-card">', unsafe_allow_html=True)
         st.markdown('<div class="info-label">策略洞察</div>', unsafe_allow_html=True)
-        st.markdown(f'<div class="info-value" style="font-size: 1rem;">{results["advice"]}</div>', unsafe_allow_html=True)
+        if results["advice"] is None and st.session_state.get('advice_error'):
+            # A failed stream is not advice: show the error and let the user try again
+            st.error(st.session_state['advice_error'])
+            if st.button("🔄 重新產生策略", key="retry_advice"):
+                st.session_state.pop('advice_error')
+                st.rerun()
+        elif results["advice"] is None:
+            # Stream the advice as it is generated, then keep it for later reruns
+            try:
+                advice = st.write_stream(analyzer.generate_advice_stream(results['text'], sentiment_label))
+            except AdviceStreamError as e:
+                st.session_state['advice_error'] = str(e)
+                st.rerun()
+            results["advice"] = advice
+            if st.session_state.get('results_id'):
+                analysis_store.update(history_owner, st.session_state['results_id'], results)
+        else:
+            st.markdown(f'<div class="info-value" style="font-size: 1rem;">{results["advice"]}</div>', unsafe_allow_html=True)
         st.markdown('</div>', unsafe_allow_html=True)
 
     with col2:
@@ -327,10 +458,18 @@ if 'results' in st.session_state:
         <div class="info-card">
             <div class="info-label">目標實體</div>
             <div class="info-value">{', '.join(info.get('company_name', ['N/A']))}</div>
-            <div style="margin-top: 8px; font-size: 0.9rem; color: #64748b;">{', '.join(info.get('stock_code', ['N/A']))}</div>
+            <div style="margin-top: 8px; font-size: 0.9rem; color: #64748b;">{', '.join(info.get('tickers') or info.get('stock_code') or ['N/A'])}</div>
         </div>
         """, unsafe_allow_html=True)
         
+        # Live quotes for the canonical tickers mentioned in the article
+        if info.get('tickers'):
+            quotes = analyzer.fetch_market_data({ticker: ticker for ticker in info['tickers'][:4]})
+            if quotes:
+                quote_cols = st.columns(len(quotes))
+                for quote_col, (ticker, quote) in zip(quote_cols, quotes.items()):
+                    quote_col.metric(label=ticker, value=f"{quote['price']:,.2f}", delta=f"{quote['change_percent']:.2f}%")
+        
         st.markdown(f"""
         <div class="info-card">
             <div class="info-label">時間軸</div>
@@ -353,18 +492,27 @@ else:
     # Trending News Section
     st.markdown("### 🔥 全球熱門財經新聞")
     
-    # Initialize news pool if not present
-    if "trending_news_pool" not in st.session_state:
-        with st.spinner("正在抓取最新頭條..."):
-            # Fetch more items to allow rotation (e.g., 20 items)
-            st.session_state["trending_news_pool"] = analyzer.fetch_trending_news(limit=20)
-            st.session_state["news_offset"] = 0
-            
-    news_pool = st.session_state["trending_news_pool"]
+    # Read the shared news pool kept fresh by the background poller (no network wait per session)
+    with st.spinner("正在抓取最新頭條..."):
+        # Fetch more items to allow rotation (e.g., 20 items)
+        pool_version, news_pool = analyzer.get_trending_news(limit=20)
+    
+    # Restart rotation when the poller has published a new pool
+    if st.session_state.get("trending_news_version") != pool_version:
+        st.session_state["trending_news_version"] = pool_version
+        st.session_state["news_offset"] = 0
     offset = st.session_state["news_offset"]
     batch_size = 3
     
     if news_pool:
+        # Score every headline in the pool with one batched call, once per pool version and model
+        scores_key = (pool_version, analyzer.model_provider, bool(analyzer.api_key))
+        if st.session_state.get("headline_scores_key") != scores_key:
+            st.session_state["headline_scores"] = analyzer.score_headlines([item['title'] for item in news_pool])
+            st.session_state["headline_scores_key"] = scores_key
+        headline_scores = st.session_state["headline_scores"]
+        badge_colors = {"positive": "#4ade80", "negative": "#f87171", "neutral": "#facc15"}
+        
         # Get current batch
         current_batch = news_pool[offset : offset + batch_size]
         
@@ -372,13 +520,23 @@ else:
         cols = st.columns(3)
         for i, item in enumerate(current_batch):
             with cols[i]:
+                # Sentiment Badge (pre-scored from the headline)
+                badge = ""
+                if item['title'] in headline_scores:
+                    label, score = headline_scores[item['title']]
+                    badge_color = badge_colors.get(label, "#94a3b8")
+                    badge = f'<span style="color: {badge_color}; border: 1px solid {badge_color}; border-radius: 999px; padding: 2px 10px; font-size: 0.75rem;">{SENTIMENT_LABELS_ZH.get(label, label)} {score * 100:.0f}</span>'
+                
                 # News Card
                 st.markdown(f"""
                 <div class="news-card" style="height: 200px; display: flex; flex-direction: column; justify-content: space-between;">
                     <div style="font-weight: 600; font-size: 1rem; margin-bottom: 12px; line-height: 1.4;">
                         <a href="{item['link']}" target="_blank" style="color: #f8fafc; text-decoration: none;">{item['title']}</a>
                     </div>
-                    <div style="font-size: 0.8rem; color: #94a3b8; margin-top: auto;">{item['published']}</div>
+                    <div style="display: flex; justify-content: space-between; align-items: center; margin-top: auto;">
+                        <div style="font-size: 0.8rem; color: #94a3b8;">{item['published']}</div>
+                        {badge}
+                    </div>
                 </div>
                 """, unsafe_allow_html=True)
                 
@@ -399,3 +557,36 @@ else:
     else:
         st.info("暫時無法取得熱門新聞")
 
+    # Per-ticker sentiment trend accumulated from past analyses (last 30 whole days)
+    trend = load_sentiment_trend(sentiment_series.version(), (time.time() // 86400 - 30) * 86400)
+    top_tickers = []
+    if not trend.empty:
+        top_tickers = trend["count"].groupby(level="ticker").sum().nlargest(5).index.tolist()
+    if top_tickers:
+        st.markdown("---")
+        st.markdown("### 📈 個股情緒趨勢")
+        trend = trend[trend.index.get_level_values("ticker").isin(top_tickers)]
+        trend_fig = go.Figure()
+        for ticker in top_tickers:
+            series = trend.xs(ticker, level="ticker")
+            trend_fig.add_trace(go.Scatter(x=series.index, y=series["rolling_mean"], mode="lines+markers", name=ticker))
+        trend_fig.update_layout(
+            height=320,
+            margin=dict(l=20, r=20, t=20, b=20),
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            yaxis=dict(range=[-1, 1], title="7 日平均情緒"),
+            font={'color': "#94a3b8", 'family': "Plus Jakarta Sans"}
+        )
+        st.plotly_chart(trend_fig, use_container_width=True)
+        
+        latest = latest_rollup(trend)
+        metric_cols = st.columns(len(latest))
+        for col, (ticker, row) in zip(metric_cols, latest.iterrows()):
+            momentum = row['momentum']
+            col.metric(
+                label=f"{ticker}（{int(row['rolling_count'])} 則）",
+                value=f"{row['rolling_mean']:+.2f}",
+                delta=None if momentum != momentum else f"{momentum:+.2f}"
+            )
+
@@ -0,0 +1,605 @@
+import asyncio
+import contextvars
+import copy
+import functools
+import inspect
+import os
+import queue
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import feedparser
+import httpx
+import openai
+
+from financial_analyzer import (
+    FinancialAnalyzer, PageReader, HostRateLimiter, AdviceStreamError, Blocking, Chat, Call, Gather,
+    HTTP_HEADERS, DEFAULT_CLIENT_OPTIONS, FETCH_CACHE_FRESH, DOWNLOAD_CHUNK_SIZE,
+    openai_client_key, remember_client
+)
+from google_news import is_google_news_url
+from instrumentation import instrumented, annotate, record_usage, record_error
+
+# Concurrent page / feed downloads per event loop (also the HTTP connection pool size)
+ASYNC_MAX_FETCHES = int(os.getenv("ASYNC_MAX_FETCHES", 20))
+# Concurrent OpenAI requests per event loop
+ASYNC_MAX_LLM_CALLS = int(os.getenv("ASYNC_MAX_LLM_CALLS", 16))
+# Worker threads for blocking local work: SQLite caches, the similarity index, parsing, tokenizing, the local model
+ASYNC_LOCAL_WORKERS = int(os.getenv("ASYNC_LOCAL_WORKERS", 8))
+# Worker threads for blocking network calls without an async client (yfinance, Google News link decoding);
+# kept apart so slow downloads never hold up cache and parsing work
+ASYNC_REMOTE_WORKERS = int(os.getenv("ASYNC_REMOTE_WORKERS", 4))
+
+_local_executor = ThreadPoolExecutor(ASYNC_LOCAL_WORKERS, thread_name_prefix="analyzer-local")
+_remote_executor = ThreadPoolExecutor(ASYNC_REMOTE_WORKERS, thread_name_prefix="analyzer-remote")
+
+
+def _run_in(executor, func, *args):
+    # Like asyncio.to_thread: the worker runs in a copy of the caller's context, so instrumentation carries over
+    context = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, functools.partial(context.run, func, *args))
+
+
+async def run_local(func, *args):
+    """
+    Run blocking local work (cache access, CPU-bound parsing or scoring) in the local worker pool.
+    """
+    return await _run_in(_local_executor, func, *args)
+
+
+async def run_remote(func, *args):
+    """
+    Run a blocking network call (yfinance, Google News link decoding) in the remote worker pool.
+    """
+    return await _run_in(_remote_executor, func, *args)
+
+
+class _LoopResources:
+    """
+    Pooled clients and concurrency limits of one event loop. Async clients and
+    semaphores are bound to the loop they are first used on, so each loop gets its own.
+    """
+
+    def __init__(self):
+        self.http = httpx.AsyncClient(
+            headers=HTTP_HEADERS, verify=False, follow_redirects=True, timeout=10,
+            limits=httpx.Limits(max_connections=ASYNC_MAX_FETCHES, max_keepalive_connections=ASYNC_MAX_FETCHES)
+        )
+        # LRU of AsyncOpenAI clients, bounded like financial_analyzer's (see remember_client)
+        self.openai_clients = OrderedDict()
+        self.fetch_slots = asyncio.Semaphore(ASYNC_MAX_FETCHES)
+        self.llm_slots = asyncio.Semaphore(ASYNC_MAX_LLM_CALLS)
+        # In-flight computations {key: task or future} for request coalescing
+        self.in_flight = {}
+
+
+_loop_resources = weakref.WeakKeyDictionary()
+_loop_resources_lock = threading.Lock()
+
+
+def _resources():
+    loop = asyncio.get_running_loop()
+    with _loop_resources_lock:
+        resources = _loop_resources.get(loop)
+        if resources is None:
+            resources = _loop_resources[loop] = _LoopResources()
+        return resources
+
+
+def get_async_openai_client(api_key, base_url=None, **options):
+    """
+    Return the running loop's shared AsyncOpenAI client for an API key / base URL / options,
+    with a pooled keep-alive HTTP connection (see DEFAULT_CLIENT_OPTIONS).
+    """
+    options = {**DEFAULT_CLIENT_OPTIONS, **options}
+    key = openai_client_key(api_key, base_url, options)
+    clients = _resources().openai_clients
+    client = clients.get(key)
+    if client is not None:
+        clients.move_to_end(key)
+        return client
+    http_client = openai.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=options["max_connections"],
+            max_keepalive_connections=options["max_keepalive_connections"],
+            keepalive_expiry=options["keepalive_expiry"]
+        ),
+        timeout=options["timeout"]
+    )
+    client = openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        http_client=http_client,
+        max_retries=options["max_retries"]
+    )
+    remember_client(clients, key, client)
+    return client
+
+
+def coalesced(make_key):
+    """
+    Async counterpart of financial_analyzer.coalesced: concurrent calls on the same event
+    loop with the same make_key(self, *args) await one shared task, and each gets a deep copy.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            calls = _resources().in_flight
+            key = make_key(self, *args, **kwargs)
+            task = calls.get(key)
+            if task is None:
+                task = calls[key] = asyncio.ensure_future(func(self, *args, **kwargs))
+                task.add_done_callback(lambda _: calls.pop(key, None) if calls.get(key) is task else None)
+            else:
+                annotate(cache="shared")
+            # A cancelled caller must not cancel the computation others are waiting for
+            return copy.deepcopy(await asyncio.shield(task))
+        return wrapper
+    return decorator
+
+
+class AsyncFinancialAnalyzer:
+    """
+    asyncio variant of FinancialAnalyzer with the same options, caches, prompts and
+    result shapes. Pages, feeds and OpenAI requests go through pooled async clients of
+    the running event loop, bounded by ASYNC_MAX_FETCHES / ASYNC_MAX_LLM_CALLS, so one
+    loop thread keeps many analyses in flight instead of blocking a thread (plus its
+    helper thread pools) per analysis.
+    The analysis stages themselves (prompts, parsing, caching) are FinancialAnalyzer's
+    *_steps generators; this class only performs their steps: chat requests on the
+    async client, blocking local work (caches, similarity index, parsing, tokenizing, the
+    local model) in the ASYNC_LOCAL_WORKERS pool. Blocking network calls (yfinance,
+    Google News) use the separate ASYNC_REMOTE_WORKERS pool.
+    Configuration and the shared helpers come from a wrapped FinancialAnalyzer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.analyzer = FinancialAnalyzer(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Options, caches and the synchronous helpers (cache keys, prompts, entity tagging...)
+        if name == "analyzer":
+            raise AttributeError(name)
+        return getattr(self.analyzer, name)
+
+    @property
+    def client(self):
+        """
+        Shared, pooled AsyncOpenAI client of the running event loop for this analyzer's API key.
+        """
+        return get_async_openai_client(self.api_key, base_url=self.base_url, **self.client_options)
+
+    async def _chat(self, **request):
+        async with _resources().llm_slots:
+            response = await self.client.chat.completions.create(model=self.model, **request)
+        record_usage(response)
+        return response
+
+    async def _run(self, steps):
+        """
+        Drive a stage generator (see FinancialAnalyzer._run) on the event loop.
+        """
+        value = error = None
+        while True:
+            try:
+                step = steps.send(value) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            value = error = None
+            try:
+                value = await self._perform(step)
+            except Exception as e:
+                error = e
+
+    async def _perform(self, step):
+        if inspect.isgenerator(step):
+            return await self._run(step)
+        if isinstance(step, Blocking):
+            return await run_local(step.func, *step.args)
+        if isinstance(step, Chat):
+            return await self._chat(**step.request)
+        if isinstance(step, Call):
+            return await getattr(self, step.name)(*step.args)
+        if isinstance(step, Gather):
+            return list(await asyncio.gather(*(self._perform(item) for item in step.steps)))
+        raise TypeError(f"Unknown stage step: {step!r}")
+
+    @instrumented("fetch")
+    @coalesced(lambda self, url: ("fetch", self.extractor, url))
+    async def fetch_news_from_url(self, url):
+        """
+        Fetches news content from a given URL.
+        """
+        try:
+            if is_google_news_url(url):
+                url, error = await run_remote(self._resolve_article_url, url)
+            else:
+                url, error = self._resolve_article_url(url)
+            if error:
+                return error
+
+            cached, headers = await run_local(self._cached_page, url)
+            if cached and time.time() - cached["fetched_at"] < FETCH_CACHE_FRESH:
+                annotate(cache="hit")
+                return cached["text"]
+
+            resources = _resources()
+            async with resources.fetch_slots:
+                async with resources.http.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and cached:
+                        return await run_local(self._revalidated_page, url, cached)
+                    response.raise_for_status()
+
+                    error = self._content_type_error(response.headers)
+                    if error:
+                        return error
+
+                    text = await self._download_text(response)
+
+            await run_local(self._store_page, url, text, response.headers)
+            return text
+        except Exception as e:
+            record_error(e)
+            return f"Error fetching URL: {str(e)}"
+
+    @instrumented("download")
+    async def _download_text(self, response):
+        """
+        Stream the response body (see PageReader); HTML parsing, incremental or of the
+        buffered page, runs in a worker thread.
+        """
+        reader = PageReader(response.headers, self.extractor)
+        async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+            # Without the streaming parser a chunk is only decoded and buffered
+            done = await run_local(reader.feed, chunk) if reader.parser is not None else reader.feed(chunk)
+            if done:
+                break
+        if reader.parser is not None:
+            return await run_local(reader.streamed_text)
+        return await run_local(self._extract_text, reader.html())
+
+    @instrumented("prepare")
+    async def _prepare_text(self, text):
+        """
+        Fit the article into the prompt token budget.
+        """
+        return await self._run(self._prepare_steps(text))
+
+    @instrumented("summarize")
+    @coalesced(lambda self, text: self._flight_key("summary", text, self.max_input_tokens))
+    async def summarize_long_text(self, text):
+        """
+        Map-reduce summary of a long article; all chunks are summarised concurrently.
+        """
+        return await self._run(self._summary_steps(text))
+
+    async def analyze_sentiment_batch(self, texts):
+        """
+        Score many texts at once. Returns: list of (label, score) in input order
+        """
+        return await self._run(self._sentiment_batch_steps(texts))
+
+    @instrumented("headlines")
+    async def score_headlines(self, titles):
+        """
+        Pre-score many headlines at once (see FinancialAnalyzer.score_headlines).
+        Returns: dict {title: (label, score)}
+        """
+        return await self._run(self._headline_steps(titles))
+
+    @instrumented("sentiment")
+    @coalesced(lambda self, text: self._flight_key("sentiment", text))
+    async def analyze_sentiment(self, text):
+        """
+        Returns: label (positive/neutral/negative), score (confidence)
+        """
+        return await self._run(self._sentiment_steps(text))
+
+    @instrumented("info")
+    @coalesced(lambda self, text: self._flight_key("info", text))
+    async def extract_info(self, text):
+        """
+        Extract key information using LLM.
+        Returns: JSON object or dict
+        """
+        return await self._run(self._info_steps(text))
+
+    @instrumented("advice")
+    @coalesced(lambda self, text, sentiment_label: self._flight_key("advice", text, sentiment_label))
+    async def generate_advice(self, text, sentiment_label):
+        """
+        Generate investment advice based on text and sentiment.
+        """
+        return await self._run(self._advice_steps(text, sentiment_label))
+
+    @instrumented("advice_stream")
+    async def generate_advice_stream(self, text, sentiment_label):
+        """
+        Streaming variant of generate_advice: an async generator of advice text pieces.
+        Raises AdviceStreamError if the advice can't be generated.
+        """
+        if not self.api_key:
+            raise AdviceStreamError("API Key is missing. Cannot generate advice.")
+
+        cache_key, cached = await run_local(self._cache_lookup, "advice", text, sentiment_label)
+        if cached is not None:
+            yield cached
+            return
+
+        # The same advice is already being generated (e.g. for another session): wait and show it at once
+        calls = _resources().in_flight
+        flight_key = self._flight_key("advice", text, sentiment_label)
+        if flight_key in calls:
+            annotate(cache="shared")
+            try:
+                advice = await asyncio.shield(calls[flight_key])
+            except Exception:
+                # The other stream stopped early (e.g. its session went away): generate the advice here
+                async for piece in self.generate_advice_stream(text, sentiment_label):
+                    yield piece
+                return
+            yield advice
+            return
+        future = calls[flight_key] = asyncio.get_running_loop().create_future()
+
+        advice = None
+        try:
+            parts = []
+            messages = self._advice_messages(await self._prepare_text(text), sentiment_label)
+            try:
+                async with _resources().llm_slots:
+                    stream = await self.client.chat.completions.create(model=self.model, messages=messages, stream=True)
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+            except Exception as e:
+                record_error(e)
+                raise AdviceStreamError(f"Error generating advice: {str(e)}") from e
+            advice = "".join(parts)
+            await run_local(self._store_streamed_advice, cache_key, messages, advice)
+        finally:
+            del calls[flight_key]
+            if advice is None:
+                future.set_exception(RuntimeError("advice stream was interrupted"))
+                # Nobody may be waiting; don't log "exception was never retrieved"
+                future.exception()
+            else:
+                future.set_result(advice)
+
+    @instrumented("analyze_all")
+    @coalesced(lambda self, text: self._flight_key("all", text))
+    async def analyze_all(self, text):
+        """
+        Run sentiment, extraction and advice in a single chat-completion request.
+        Returns: dict {sentiment: (label, score), info: dict, advice: str}
+        """
+        return await self._run(self._all_steps(text))
+
+    @instrumented("pipeline")
+    async def analyze_pipeline(self, text, progress_callback=None, include_advice=True):
+        """
+        Run sentiment and extraction concurrently and start advice as soon as the
+        sentiment label is available (see FinancialAnalyzer.analyze_pipeline).
+        progress_callback(stage, result) is called from the awaiting coroutine as each stage
+        finishes, like FinancialAnalyzer calls it from the calling thread (SyncFinancialAnalyzer
+        hands it back to its calling thread).
+        Returns: dict {sentiment: (label, score), info: dict, advice: str}
+        """
+        text = await self._prepare_text(text)
+        results = {}
+        stages = {
+            asyncio.ensure_future(self._perform(step)): stage
+            for stage, step in self._pipeline_stages(text, include_advice=include_advice)
+        }
+        pending = set(stages)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage = stages[task]
+                    results[stage] = task.result()
+                    for next_stage, step in self._pipeline_stages(text, stage, results[stage], include_advice):
+                        next_task = asyncio.ensure_future(self._perform(step))
+                        stages[next_task] = next_stage
+                        pending.add(next_task)
+
+                    if progress_callback:
+                        progress_callback(stage, results[stage])
+        finally:
+            for task in pending:
+                task.cancel()
+        return results
+
+    @instrumented("analyze_url")
+    async def analyze_url(self, url, mode="all"):
+        """
+        Fetch one URL and analyze it.
+        mode: "all" (single combined request) or "pipeline" (concurrent stages).
+        Returns: dict {url, sentiment, info, advice} or {url, error}
+        """
+        text = await self.fetch_news_from_url(url)
+        if text.startswith("Error"):
+            return {"url": url, "error": text}
+        analysis = await (self.analyze_all(text) if mode == "all" else self.analyze_pipeline(text))
+        return {"url": url, **analysis}
+
+    async def analyze_batch(self, urls, concurrency=4, per_host_interval=1.0, mode="all"):
+        """
+        Analyze many URLs with bounded concurrency and a per-host rate limit.
+        Async generator of result dicts (see analyze_url) in completion order,
+        each with an extra "elapsed" field in seconds.
+        """
+        limiter = HostRateLimiter(per_host_interval)
+
+        async def run(url):
+            await asyncio.sleep(max(limiter.reserve(url), 0))
+            start = time.perf_counter()
+            try:
+                result = await self.analyze_url(url, mode=mode)
+            except Exception as e:
+                result = {"url": url, "error": f"Error analyzing URL: {str(e)}"}
+            result["elapsed"] = round(time.perf_counter() - start, 3)
+            return result
+
+        # Keep at most `concurrency` analyses in flight so huge inputs are consumed lazily
+        pending = set()
+        try:
+            for url in urls:
+                pending.add(asyncio.ensure_future(run(url)))
+                if len(pending) >= concurrency:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def fetch_feed(self, feed):
+        """
+        Fetch and parse one RSS feed, revalidating with the aggregator's ETag / Last-Modified.
+        A failing feed returns its previous entries.
+        """
+        aggregator = self.feed_aggregator
+        url = feed["url"]
+        try:
+            resources = _resources()
+            async with resources.fetch_slots:
+                response = await resources.http.get(
+                    url, headers=aggregator.conditional_headers(url), timeout=aggregator.timeout
+                )
+            if response.status_code == 304:
+                return aggregator.cached_entries(url)
+            response.raise_for_status()
+            parsed = await run_local(feedparser.parse, response.content)
+            return aggregator.store_feed(feed, parsed, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        except Exception as e:
+            print(f"Error fetching feed {url}: {e}")
+            return aggregator.cached_entries(url)
+
+    @instrumented("trending")
+    async def fetch_trending_news(self, limit=5):
+        """
+        Fetch trending financial news from all configured RSS feeds concurrently.
+        Returns: List of dicts {title, link, published, source, sources}
+        """
+        try:
+            feeds = await asyncio.gather(*(self.fetch_feed(feed) for feed in self.feed_aggregator.feeds))
+            pool = self.feed_aggregator.merge([entry for entries in feeds for entry in entries])
+
+            links = [item["link"] for item in pool if is_google_news_url(item["link"])]
+            resolved = await run_remote(self.link_resolver.resolve_many, links) if links else {}
+            return self._select_trending(pool, resolved, limit)
+        except Exception as e:
+            record_error(e)
+            print(f"Error fetching trending news: {e}")
+            return []
+
+    async def fetch_market_data(self, watchlist=None):
+        """
+        Market data for the watchlist (see FinancialAnalyzer.fetch_market_data);
+        yfinance is blocking, so it runs in the remote worker pool.
+        """
+        return await run_remote(self.analyzer.fetch_market_data, watchlist)
+
+
+_event_loop = None
+_event_loop_lock = threading.Lock()
+
+
+def get_event_loop():
+    """
+    Process-wide event loop running in a daemon thread, shared by all SyncFinancialAnalyzer instances.
+    """
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="analyzer-event-loop", daemon=True).start()
+            _event_loop = loop
+        return _event_loop
+
+
+def run_sync(coroutine, timeout=None):
+    """
+    Run a coroutine on the shared event loop and wait for its result.
+    The coroutine runs in a copy of the caller's context, so instrumentation traces carry over.
+    """
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result(timeout)
+
+
+def iterate_sync(async_iterable):
+    """
+    Consume an async iterable on the shared event loop, yielding its items in the calling thread.
+    """
+    items = queue.Queue()
+    done = object()
+
+    async def pump():
+        try:
+            async for item in async_iterable:
+                items.put(item)
+        finally:
+            items.put(done)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_event_loop())
+    try:
+        for item in iter(items.get, done):
+            yield item
+        future.result()
+    finally:
+        future.cancel()
+
+
+class SyncFinancialAnalyzer:
+    """
+    Blocking facade over AsyncFinancialAnalyzer with FinancialAnalyzer's interface (for app.py).
+    Calls run on the shared background event loop, so the network I/O of all sessions is
+    multiplexed on one thread while each caller simply waits for its own result.
+    Generators (generate_advice_stream, analyze_batch) yield in the calling thread, and
+    analyze_pipeline's progress_callback is also called from the calling thread.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.async_analyzer = AsyncFinancialAnalyzer(*args, **kwargs)
+
+    def __getattr__(self, name):
+        attr = getattr(self.async_analyzer, name)
+        if inspect.iscoroutinefunction(attr):
+            @functools.wraps(attr)
+            def blocking(*args, **kwargs):
+                return run_sync(attr(*args, **kwargs))
+            return blocking
+        return attr
+
+    def generate_advice_stream(self, text, sentiment_label):
+        return iterate_sync(self.async_analyzer.generate_advice_stream(text, sentiment_label))
+
+    def analyze_batch(self, urls, concurrency=4, per_host_interval=1.0, mode="all"):
+        return iterate_sync(self.async_analyzer.analyze_batch(urls, concurrency, per_host_interval, mode))
+
+    def analyze_pipeline(self, text, progress_callback=None, include_advice=True):
+        events = queue.Queue()
+        done = object()
+        future = asyncio.run_coroutine_threadsafe(
+            self.async_analyzer.analyze_pipeline(
+                text, lambda stage, result: events.put((stage, result)), include_advice
+            ),
+            get_event_loop()
+        )
+        future.add_done_callback(lambda _: events.put(done))
+        # Hand stage results back to this thread, which may own UI widgets
+        for stage, result in iter(events.get, done):
+            if progress_callback:
+                progress_callback(stage, result)
+        return future.result()
@@ -0,0 +1,95 @@
+"""
+Analyze many news URLs from the command line and stream the results as JSONL.
+
+Usage:
+    python batch_analyze.py urls.txt                           # one URL per line ('#' comments allowed)
+    python batch_analyze.py --rss https://finance.yahoo.com/news/rssindex -o scores.jsonl
+    python batch_analyze.py --rss FEED_URL --every 300         # re-score the feed every 5 minutes
+    python batch_analyze.py urls.txt --timeseries              # also feed the dashboard's ticker sentiment trends
+    cat urls.txt | python batch_analyze.py -
+"""
+import argparse
+import json
+import sys
+import time
+
+import feedparser
+
+from financial_analyzer import FinancialAnalyzer
+from sentiment_timeseries import SentimentTimeSeries
+
+
+def read_url_file(path):
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        return [line.strip() for line in stream if line.strip() and not line.lstrip().startswith("#")]
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+
+def read_feed_urls(feed_url, limit=None):
+    feed = feedparser.parse(feed_url)
+    links = [entry.link for entry in feed.entries if entry.get("link")]
+    return links[:limit] if limit else links
+
+
+def run_once(analyzer, urls, args, output, series=None):
+    start = time.perf_counter()
+    count = errors = 0
+    for result in analyzer.analyze_batch(
+        urls, concurrency=args.concurrency, per_host_interval=args.host_interval, mode=args.mode
+    ):
+        result["analyzed_at"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+        if series is not None and "error" not in result:
+            label, score = result["sentiment"]
+            series.record(result["info"].get("tickers") or result["info"].get("stock_code", []), label, score, url=result["url"])
+        count += 1
+        errors += "error" in result
+    print(f"Analyzed {count} URLs ({errors} errors) in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url_file", nargs="?", help="file with one URL per line, or '-' for stdin")
+    parser.add_argument("--rss", help="RSS/Atom feed whose entry links should be analyzed")
+    parser.add_argument("--limit", type=int, default=None, help="maximum number of feed entries")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="parallel analyses")
+    parser.add_argument("--host-interval", type=float, default=1.0, help="minimum seconds between requests to one host")
+    parser.add_argument("--mode", choices=["all", "pipeline"], default="all",
+                        help="'all': one combined LLM request per article; 'pipeline': concurrent stages")
+    parser.add_argument("--timeseries", action="store_true",
+                        help="also record per-ticker sentiment in the dashboard's trend store")
+    parser.add_argument("--every", type=float, default=None, help="repeat every N seconds (feed mode)")
+    args = parser.parse_args()
+
+    if not args.url_file and not args.rss:
+        parser.error("provide a URL file or --rss FEED_URL")
+
+    analyzer = FinancialAnalyzer()
+    if not analyzer.api_key:
+        print("Warning: OPENAI_API_KEY is not set, LLM results will be empty", file=sys.stderr)
+
+    series = SentimentTimeSeries(flush_rows=100) if args.timeseries else None
+    output = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        while True:
+            urls = read_feed_urls(args.rss, args.limit) if args.rss else read_url_file(args.url_file)
+            run_once(analyzer, urls, args, output, series)
+            if series is not None:
+                series.flush()
+            if not args.every:
+                break
+            time.sleep(args.every)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Offline benchmark of the FinancialAnalyzer hot paths.
+
+Saved HTML fixtures and a recorded RSS payload are replayed from a local stub HTTP
+server, which also acts as an OpenAI-compatible endpoint with configurable latency,
+so every stage runs without network access or API costs. For each stage it reports
+p50/p95 latency, throughput and peak Python memory (tracemalloc, measured in a
+separate pass so tracing does not distort the timings).
+
+Usage:
+    python benchmark.py                                   # all stages, 20 runs each
+    python benchmark.py --stages fetch,extract,analyze_all --iterations 50
+    python benchmark.py --llm-latency 400 --concurrency 8 --json results.json
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from financial_analyzer import FinancialAnalyzer
+from async_analyzer import SyncFinancialAnalyzer
+from result_cache import ResultCache
+from text_extractor import extract_text
+
+# Fixtures live next to this script, whatever the working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIR = os.path.join(BASE_DIR, "fixtures")
+ARTICLE_FIXTURES = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+EXTRACT_FIXTURES = [os.path.join(BASE_DIR, "google_redirect.html")] + ARTICLE_FIXTURES
+FEED_FIXTURE = os.path.join(FIXTURE_DIR, "feed.xml")
+
+# Canned model replies: one JSON object that satisfies every JSON-mode prompt, and plain-text advice
+ANALYSIS_REPLY = {
+    "label": "positive", "score": 0.82,
+    "sentiment": {"label": "positive", "score": 0.82},
+    "company_name": ["台積電"], "stock_code": ["2330"],
+    "financial_data": {"revenue": "9,875 億元", "eps": "17.2 元"},
+    "events": ["第三季營收創新高", "上修全年資本支出"],
+    "time_info": "2026 年第三季",
+    "advice": "短期觀察重點：財報優於預期。長期投資潛力：AI 需求強勁。風險提示：匯率與地緣政治。"
+}
+ADVICE_REPLY = (
+    "1. 短期觀察重點：財報優於預期，留意法說會後的量價變化。\n"
+    "2. 長期投資潛力：AI 與高效能運算需求帶動先進製程成長。\n"
+    "3. 風險提示：匯率波動、關稅政策與地緣政治風險。"
+)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; without this, delayed ACKs add ~40 ms per response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/feed.xml":
+            self._send(200, self.server.feed, "application/rss+xml; charset=utf-8")
+        elif path.startswith("/articles/") and path[len("/articles/"):] in self.server.pages:
+            self._send(200, self.server.pages[path[len("/articles/"):]], "text/html; charset=utf-8")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send(404, b"{}", "application/json")
+            return
+        time.sleep(self.server.llm_latency)
+        prompt = body["messages"][-1]["content"]
+        if body.get("stream"):
+            self._stream(body, ADVICE_REPLY)
+            return
+        if "標題：" in prompt:
+            count = len(re.findall(r"^\s*\d+\. ", prompt, re.M))
+            content = json.dumps({"results": [
+                {"id": i + 1, "label": "positive", "score": 0.7} for i in range(count)
+            ]})
+        elif body.get("response_format"):
+            content = json.dumps(ANALYSIS_REPLY, ensure_ascii=False)
+        else:
+            content = ADVICE_REPLY
+        reply = {
+            "id": "chatcmpl-benchmark", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(prompt) + len(content)) // 4}
+        }
+        self._send(200, json.dumps(reply).encode("utf-8"), "application/json")
+
+    def _stream(self, body, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        pieces = [text[i:i + 8] for i in range(0, len(text), 8)]
+        for i, piece in enumerate(pieces):
+            chunk = {
+                "id": "chatcmpl-benchmark", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": piece},
+                             "finish_reason": "stop" if i == len(pieces) - 1 else None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(self.server.token_latency)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class StubServer(ThreadingHTTPServer):
+    """
+    Local server for the saved article pages, the recorded feed and a fake
+    /v1/chat/completions endpoint (latencies in seconds).
+    """
+    daemon_threads = True
+
+    def __init__(self, llm_latency=0.2, token_latency=0.005):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.llm_latency = llm_latency
+        self.token_latency = token_latency
+        self.pages = {}
+        for path in ARTICLE_FIXTURES:
+            with open(path, "rb") as f:
+                self.pages[os.path.basename(path)] = f.read()
+        with open(FEED_FIXTURE, encoding="utf-8") as f:
+            self.feed = f.read().replace("{base_url}", self.base_url).encode("utf-8")
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def percentile(values, q):
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+def peak_memory(func, arg):
+    """
+    Peak traced Python allocations (bytes) above the starting point for one call.
+    """
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        func(arg)
+        return tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+
+def run_stage(name, func, inputs, iterations, check=None):
+    """
+    Call func over the inputs (round robin) `iterations` times.
+    Returns: dict {stage, runs, errors, p50_ms, p95_ms, throughput, peak_kb}
+    """
+    timings = []
+    errors = 0
+    start = time.perf_counter()
+    for i in range(iterations):
+        call_start = time.perf_counter()
+        result = func(inputs[i % len(inputs)])
+        timings.append(time.perf_counter() - call_start)
+        if check and not check(result):
+            errors += 1
+    wall = time.perf_counter() - start
+    return {
+        "stage": name, "runs": iterations, "errors": errors,
+        "p50_ms": percentile(timings, 50) * 1000, "p95_ms": percentile(timings, 95) * 1000,
+        "throughput": iterations / wall, "peak_kb": peak_memory(func, inputs[0]) / 1024
+    }
+
+
+def run_batch_stage(analyzer, urls, concurrency, name="analyze_batch"):
+    """
+    analyze_batch over all URLs at once: per-article latency and overall articles/s.
+    """
+    start = time.perf_counter()
+    results = list(analyzer.analyze_batch(urls, concurrency=concurrency, per_host_interval=0))
+    wall = time.perf_counter() - start
+    timings = [r["elapsed"] for r in results]
+    return {
+        "stage": f"{name} (c={concurrency})", "runs": len(results),
+        "errors": sum("error" in r for r in results),
+        "p50_ms": percentile(timings, 50) * 1000, "p95_ms": percentile(timings, 95) * 1000,
+        "throughput": len(results) / wall,
+        "peak_kb": peak_memory(lambda batch: list(analyzer.analyze_batch(batch, concurrency=concurrency,
+                                                                           per_host_interval=0)), urls) / 1024
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", help="comma-separated subset of stages to run (default: all)")
+    parser.add_argument("--iterations", type=int, default=20, help="runs per stage")
+    parser.add_argument("--llm-latency", type=float, default=200, help="stub LLM response latency in ms")
+    parser.add_argument("--token-latency", type=float, default=5, help="delay between streamed chunks in ms")
+    parser.add_argument("--concurrency", type=int, default=4, help="workers for the analyze_batch stage")
+    parser.add_argument("--json", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    # Never send stub traffic through a configured proxy
+    os.environ["NO_PROXY"] = ",".join(filter(None, [os.environ.get("NO_PROXY"), "127.0.0.1", "localhost"]))
+
+    with StubServer(args.llm_latency / 1000, args.token_latency / 1000) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        base_url = server.base_url
+        urls = [f"{base_url}/articles/{name}" for name in server.pages]
+        feeds = [{"name": "stub", "url": f"{base_url}/feed.xml"}]
+        # No persistent stores by default; the cached fetcher's page and link caches live in tmp
+        options = dict(api_key="sk-benchmark", base_url=f"{base_url}/v1", cache=False, fetch_cache=False, feeds=feeds)
+        analyzer = FinancialAnalyzer(**options)
+        cached_fetcher = FinancialAnalyzer(
+            **dict(options, fetch_cache=ResultCache(os.path.join(tmp, "http.sqlite"), namespace="http"))
+        )
+        local = FinancialAnalyzer(**dict(options, model_provider="local"))
+        async_analyzer = SyncFinancialAnalyzer(**options)
+
+        htmls = []
+        for path in EXTRACT_FIXTURES:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                htmls.append(f.read())
+        texts = [analyzer.fetch_news_from_url(url) for url in urls]
+        titles = [item["title"] for item in analyzer.feed_aggregator.get_pool()]
+        not_error = lambda result: not str(result).startswith("Error")
+
+        stages = {
+            "extract": lambda: run_stage("extract", extract_text, htmls, args.iterations),
+            "fetch": lambda: run_stage("fetch", analyzer.fetch_news_from_url, urls, args.iterations, not_error),
+            "fetch_cached": lambda: run_stage(
+                "fetch (cached)", cached_fetcher.fetch_news_from_url, urls, args.iterations, not_error
+            ),
+            "feeds": lambda: run_stage(
+                "feeds", lambda _: analyzer.feed_aggregator.get_pool(), [None], args.iterations, bool
+            ),
+            "prepare": lambda: run_stage("prepare_text", analyzer._prepare_text, texts, args.iterations),
+            "sentiment": lambda: run_stage(
+                "analyze_sentiment", analyzer.analyze_sentiment, texts, args.iterations, lambda r: r[1] > 0
+            ),
+            "sentiment_local": lambda: run_stage(
+                "analyze_sentiment (local)", local.analyze_sentiment, texts, args.iterations
+            ),
+            "info": lambda: run_stage(
+                "extract_info", analyzer.extract_info, texts, args.iterations, lambda r: "error" not in r
+            ),
+            "advice": lambda: run_stage(
+                "generate_advice", lambda text: analyzer.generate_advice(text, "正面"), texts, args.iterations,
+                lambda r: not r.startswith("Error")
+            ),
+            "advice_stream": lambda: run_stage(
+                "generate_advice_stream", lambda text: "".join(analyzer.generate_advice_stream(text, "正面")),
+                texts, args.iterations, bool
+            ),
+            "headlines": lambda: run_stage(
+                "score_headlines", analyzer.score_headlines, [titles], args.iterations, lambda r: len(r) == len(titles)
+            ),
+            "analyze_all": lambda: run_stage(
+                "analyze_all", analyzer.analyze_all, texts, args.iterations, lambda r: "error" not in r["info"]
+            ),
+            "pipeline": lambda: run_stage(
+                "analyze_pipeline", analyzer.analyze_pipeline, texts, args.iterations,
+                lambda r: "error" not in r["info"]
+            ),
+            "batch": lambda: run_batch_stage(
+                analyzer, [f"{urls[i % len(urls)]}?n={i}" for i in range(args.iterations)], args.concurrency
+            ),
+            "pipeline_async": lambda: run_stage(
+                "analyze_pipeline (async)", async_analyzer.analyze_pipeline, texts, args.iterations,
+                lambda r: "error" not in r["info"]
+            ),
+            "batch_async": lambda: run_batch_stage(
+                async_analyzer, [f"{urls[i % len(urls)]}?n={i}" for i in range(args.iterations)], args.concurrency,
+                name="analyze_batch (async)"
+            )
+        }
+        selected = args.stages.split(",") if args.stages else list(stages)
+        unknown = [name for name in selected if name not in stages]
+        if unknown:
+            parser.error(f"unknown stages: {', '.join(unknown)} (choose from {', '.join(stages)})")
+
+        print(f"Stub server {base_url}, LLM latency {args.llm_latency:.0f} ms, {args.iterations} runs per stage\n")
+        print(f"{'stage':<28} {'runs':>5} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>9} {'peak KB':>9}")
+        results = []
+        for name in selected:
+            result = stages[name]()
+            results.append(result)
+            print(f"{result['stage']:<28} {result['runs']:>5} {result['errors']:>6} {result['p50_ms']:>9.2f} "
+                  f"{result['p95_ms']:>9.2f} {result['throughput']:>9.1f} {result['peak_kb']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"llm_latency_ms": args.llm_latency, "iterations": args.iterations, "stages": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
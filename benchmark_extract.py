@@ -0,0 +1,56 @@
+"""
+Benchmark the HTML-to-text extractors over saved HTML fixtures.
+
+Usage:
+    python benchmark_extract.py                       # google_redirect.html + fixtures/*.html
+    python benchmark_extract.py page1.html page2.html --repeat 50 --max-chars 20000
+"""
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from text_extractor import EXTRACTORS, extract_text
+
+# Fixtures live next to this script, whatever the working directory
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FIXTURES = [os.path.join(BASE_DIR, "google_redirect.html")] + sorted(
+    glob.glob(os.path.join(BASE_DIR, "fixtures", "*.html"))
+)
+
+
+def benchmark(html, engine, repeat, max_chars):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = extract_text(html, engine=engine, max_chars=max_chars)
+        timings.append(time.perf_counter() - start)
+    return timings, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("fixtures", nargs="*", default=DEFAULT_FIXTURES, help="saved HTML files")
+    parser.add_argument("--repeat", type=int, default=20, help="runs per extractor and fixture")
+    parser.add_argument("--max-chars", type=int, default=None, help="stop after this many characters")
+    args = parser.parse_args()
+
+    print(f"{'fixture':<32} {'engine':<8} {'median ms':>10} {'min ms':>8} {'chars':>8}  speedup vs bs4")
+    for path in args.fixtures:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        name = f"{os.path.basename(path)} ({len(html) // 1024} KB)"
+
+        baseline = None
+        for engine in ["bs4"] + [e for e in EXTRACTORS if e != "bs4"]:
+            timings, text = benchmark(html, engine, args.repeat, args.max_chars)
+            median = statistics.median(timings)
+            if baseline is None:
+                baseline = median
+            print(f"{name:<32} {engine:<8} {median * 1000:>10.2f} {min(timings) * 1000:>8.2f} "
+                  f"{len(text):>8}  {baseline / median:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import difflib
+import json
+import os
+import re
+import threading
+import unicodedata
+
+# Prebuilt symbol table: [{"ticker", "name", "aliases", "ambiguous"}], tickers in yfinance format;
+# "ambiguous" lists names / aliases that are also common words ("統一", "創意", "蘋果")
+SYMBOL_TABLE_PATH = os.getenv(
+    "SYMBOL_TABLE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "symbols.json")
+)
+# Minimum difflib similarity for the fuzzy fallback
+FUZZY_CUTOFF = float(os.getenv("ENTITY_FUZZY_CUTOFF", 0.85))
+
+EXCHANGE_PREFIX = re.compile(r"^(?:TPE|TWSE|TWO|TPEX|NASDAQ|NYSE|AMEX|HKEX|TYO|KRX)\s*[:：]\s*", re.I)
+LISTED_CODE = re.compile(r"^(\d{4,6})(?:\.(?:TW|TWO))?$", re.I)
+# Bare 4-digit numbers in text are usually years or amounts; only trust codes in brackets or with a suffix
+TEXT_CODE = re.compile(r"[(（]\s*(\d{4,6})(?:\.(?i:TWO?))?\s*[)）]|\b(\d{4,6})\.(?i:TWO?)\b")
+CORPORATE_SUFFIX = re.compile(
+    r"(?:股份有限公司|有限公司|公司|集團|控股|inc|corp|corporation|ltd|limited|plc|holdings?|group)$"
+)
+# Words right after an ambiguous alias that show it names the company ("統一股價", "南亞(1303)")
+COMPANY_CONTEXT = re.compile(
+    r"\s*(?:股價|股份|股東|股利|公司|企業|集團|營收|財報|董事|市值|法說|[(（]\s*\d{4,6}|ADR|shares?\b|stock\b|Inc\b)", re.I
+)
+PUNCTUATION = re.compile(r"[\s.,'\"()（）\-_/&·]+")
+
+
+def normalize_alias(name):
+    """
+    Lookup key for a company name or code: NFKC width folding, case folding,
+    no punctuation or whitespace, and no trailing corporate suffix ("Inc", "股份有限公司").
+    """
+    key = unicodedata.normalize("NFKC", str(name)).casefold()
+    key = EXCHANGE_PREFIX.sub("", key)
+    key = PUNCTUATION.sub("", key)
+    stripped = CORPORATE_SUFFIX.sub("", key)
+    return stripped or key
+
+
+class EntityIndex:
+    """
+    Maps company names, aliases and codes ("台積電", "TSMC", "2330") to canonical tickers.
+    Exact lookups are a single dict probe on the normalized alias; a difflib fuzzy
+    match is the fallback and is memoized. tag() finds known entities in free text
+    with one precompiled regex, longest alias first; an ambiguous alias only counts
+    next to company context or when the company is also mentioned unambiguously.
+    """
+
+    def __init__(self, symbols, fuzzy_cutoff=FUZZY_CUTOFF):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.names = {}
+        self.aliases = {}
+        # Matched as written: "蘋果公司" is unambiguous even though it normalizes to "蘋果"
+        self.ambiguous = {alias.strip().casefold() for symbol in symbols for alias in symbol.get("ambiguous", [])}
+        for symbol in symbols:
+            ticker = symbol["ticker"]
+            self.names[ticker] = symbol.get("name", ticker)
+            for alias in [ticker, symbol.get("name", "")] + list(symbol.get("aliases", [])):
+                key = normalize_alias(alias)
+                if key:
+                    # The first symbol to claim an alias keeps it
+                    self.aliases.setdefault(key, ticker)
+        self._keys = list(self.aliases)
+        self._fuzzy_memo = {}
+        self._fuzzy_lock = threading.Lock()
+        self.pattern = self._build_pattern(symbols)
+
+    @classmethod
+    def load(cls, path=SYMBOL_TABLE_PATH):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def _build_pattern(symbols):
+        terms = set()
+        for symbol in symbols:
+            for alias in [symbol.get("name", "")] + list(symbol.get("aliases", [])):
+                alias = alias.strip()
+                # Codes are matched by TEXT_CODE; tickers alone ("MS", "KO") are too ambiguous in prose
+                if alias and not alias.isdigit():
+                    terms.add(alias)
+        alternatives = []
+        for term in sorted(terms, key=len, reverse=True):
+            if not term.isascii():
+                alternatives.append(re.escape(term))
+            elif len(term) <= 4:
+                # Short acronyms ("ASE", "Arm") must match case-sensitively
+                alternatives.append(rf"\b{re.escape(term)}\b")
+            else:
+                alternatives.append(rf"(?i:\b{re.escape(term)}\b)")
+        # TEXT_CODE goes first so its groups stay 1 and 2
+        return re.compile("|".join([TEXT_CODE.pattern] + alternatives))
+
+    def _fuzzy(self, key):
+        with self._fuzzy_lock:
+            if key in self._fuzzy_memo:
+                return self._fuzzy_memo[key]
+        matches = difflib.get_close_matches(key, self._keys, n=1, cutoff=self.fuzzy_cutoff)
+        ticker = self.aliases[matches[0]] if matches else None
+        with self._fuzzy_lock:
+            self._fuzzy_memo[key] = ticker
+        return ticker
+
+    def resolve(self, name, fuzzy=True):
+        """
+        Returns the canonical ticker for a name, alias or code, or None if unknown.
+        """
+        if not name or not str(name).strip():
+            return None
+        key = normalize_alias(name)
+        ticker = self.aliases.get(key)
+        if ticker:
+            return ticker
+        code = LISTED_CODE.match(key)
+        if code:
+            return self.aliases.get(code.group(1))
+        if fuzzy and len(key) >= 4:
+            return self._fuzzy(key)
+        return None
+
+    def name_of(self, ticker):
+        return self.names.get(ticker, ticker)
+
+    def tag(self, text):
+        """
+        Known entities mentioned in a text.
+        Returns: dict {ticker: mention count} in order of first mention
+        """
+        text = text or ""
+        found = {}
+        unconfirmed = {}
+        for match in self.pattern.finditer(text):
+            code = match.group(1) or match.group(2)
+            key = code or normalize_alias(match.group(0))
+            ticker = self.aliases.get(key)
+            if not ticker:
+                continue
+            if (not code and match.group(0).casefold() in self.ambiguous
+                    and not COMPANY_CONTEXT.match(text, match.end())):
+                # "統一標準", "發揮創意": keep only if the company shows up unambiguously as well
+                unconfirmed.setdefault(ticker, []).append(match.start())
+                continue
+            found[ticker] = found.get(ticker, 0) + 1
+        for ticker, positions in unconfirmed.items():
+            if ticker in found:
+                found[ticker] += len(positions)
+        return found
+
+    def normalize_info(self, info):
+        """
+        Add canonical "tickers" to an extract_info result, resolved from its
+        stock_code and company_name entries (unresolvable entries are left as they are).
+        """
+        if not isinstance(info, dict) or "error" in info:
+            return info
+        tickers = []
+        for value in list(info.get("stock_code") or []) + list(info.get("company_name") or []):
+            ticker = self.resolve(value)
+            if ticker and ticker not in tickers:
+                tickers.append(ticker)
+        return dict(info, tickers=tickers)
+
+
+_entity_index = None
+_entity_index_lock = threading.Lock()
+
+
+def get_entity_index():
+    """
+    Process-wide EntityIndex loaded from SYMBOL_TABLE_PATH on first use.
+    """
+    global _entity_index
+    with _entity_index_lock:
+        if _entity_index is None:
+            _entity_index = EntityIndex.load()
+        return _entity_index
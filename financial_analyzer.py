@@ -3,78 +3,1104 @@ import pandas as pd
 import openai
 import json
 import os
+import re
+import codecs
+import math
+from urllib.parse import urlparse
 import feedparser
-from bs4 import BeautifulSoup
 import time
 import requests
 import yfinance as yf
 import urllib3
+import httpx
+import threading
+import copy
+import hashlib
+import functools
+import inspect
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based token estimate
+    tiktoken = None
+from result_cache import ResultCache, make_cache_key, normalize_text
+from text_extractor import extract_text, StreamingTextExtractor
+from news_feeds import FeedAggregator
+from news_poller import NewsPoller
+from google_news import GoogleNewsResolver, is_google_news_url
+from local_sentiment import load_sentiment_model
+from analysis_models import SentimentResult, ExtractedInfo, parse_json_lenient
+from entity_index import get_entity_index
+from similarity_index import get_similarity_index, content_digest
+from instrumentation import instrumented, annotate, record_usage, record_error, propagate, get_instrumentation
 
 # Suppress SSL warnings for scraper
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
+# Display labels used for the dashboard and the advice prompt
+SENTIMENT_LABELS_ZH = {
+    "positive": "正面",
+    "negative": "負面",
+    "neutral": "中立"
+}
+
+# Bump whenever a prompt changes so cached LLM results from older prompts are not reused
+PROMPT_VERSION = "4"
+
+# Ask for response_format={"type": "json_object"}; turned off automatically for endpoints that reject it
+JSON_MODE = os.getenv("OPENAI_JSON_MODE", "1") != "0"
+
+# Persistent LLM result cache settings
+CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", os.path.join(".cache", "analysis.sqlite"))
+CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", 5000))
+# SimHash fingerprints of analyzed articles; syndicated copies reuse the first copy's cached analysis
+SIMHASH_INDEX_PATH = os.getenv("SIMHASH_INDEX_PATH", os.path.join(os.path.dirname(CACHE_PATH), "simhash.bin"))
+
+# Scraped pages: served without revalidation for FETCH_CACHE_FRESH seconds,
+# then revalidated with If-None-Match / If-Modified-Since until FETCH_CACHE_TTL
+FETCH_CACHE_FRESH = float(os.getenv("FETCH_CACHE_FRESH", 300))
+FETCH_CACHE_TTL = float(os.getenv("FETCH_CACHE_TTL", 24 * 3600))
+FETCH_CACHE_MAX_ENTRIES = int(os.getenv("FETCH_CACHE_MAX_ENTRIES", 2000))
+
+# Google News article ID -> publisher URL; IDs that could not be resolved are retried
+# only after GOOGLE_NEWS_FAILURE_TTL seconds instead of on every trending refresh
+GOOGLE_NEWS_CACHE_TTL = float(os.getenv("GOOGLE_NEWS_CACHE_TTL", 30 * 24 * 3600))
+GOOGLE_NEWS_CACHE_MAX_ENTRIES = int(os.getenv("GOOGLE_NEWS_CACHE_MAX_ENTRIES", 5000))
+GOOGLE_NEWS_FAILURE_TTL = float(os.getenv("GOOGLE_NEWS_FAILURE_TTL", 15 * 60))
+
+# Article text kept per page; only the most useful part is ever sent to the LLM
+EXTRACT_MAX_CHARS = int(os.getenv("EXTRACT_MAX_CHARS", 20000))
+
+# Download budget per page; bodies are streamed and reading stops at this many bytes
+MAX_DOWNLOAD_BYTES = int(os.getenv("MAX_DOWNLOAD_BYTES", 2 * 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = 16 * 1024
+
+# Content types that may contain an article; anything else (PDF, images, video...) is rejected up front
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain", "application/xml", "text/xml")
+
+HTTP_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """
+    Return the module-level requests session used for scraping.
+    Connections are pooled and kept alive across calls, analyzers and Streamlit reruns.
+    """
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            session = requests.Session()
+            session.verify = False
+            session.headers.update(HTTP_HEADERS)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=20, pool_maxsize=20)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _http_session = session
+        return _http_session
+
+
+# Default market overview watchlist {symbol: display name};
+# override with MARKET_WATCHLIST="^GSPC:S&P 500,2330.TW:台積電" or the watchlist argument
+DEFAULT_WATCHLIST = {
+    "^GSPC": "S&P 500",
+    "^IXIC": "Nasdaq",
+    "^TWII": "台灣加權",
+    "BTC-USD": "Bitcoin"
+}
+if os.getenv("MARKET_WATCHLIST"):
+    DEFAULT_WATCHLIST = dict(
+        item.split(":", 1) if ":" in item else (item, item)
+        for item in (part.strip() for part in os.getenv("MARKET_WATCHLIST").split(","))
+        if item
+    )
+# Market quotes are shared by every session in the process for this many seconds
+MARKET_DATA_TTL = float(os.getenv("MARKET_DATA_TTL", 60))
+
+_market_data_cache = {}
+_market_data_lock = threading.Lock()
+
+# Background trending-news refresh: one poller per process feeds every session
+NEWS_POLL_INTERVAL = float(os.getenv("NEWS_POLL_INTERVAL", 300))
+NEWS_POOL_SIZE = int(os.getenv("NEWS_POOL_SIZE", 50))
+
+_news_poller = None
+_news_poller_lock = threading.Lock()
+
+# Headlines scored per batched LLM request
+HEADLINE_BATCH_SIZE = 50
+
+# Token budget for the article body sent with each LLM prompt
+MAX_INPUT_TOKENS = int(os.getenv("MAX_INPUT_TOKENS", 1500))
+# "truncate" keeps the most informative paragraphs; "map_reduce" summarises long articles first
+LONG_DOCUMENT_MODE = os.getenv("LONG_DOCUMENT_MODE", "truncate")
+# In "map_reduce" mode, articles longer than this many tokens are summarised chunk by chunk first
+MAP_REDUCE_THRESHOLD_TOKENS = int(os.getenv("MAP_REDUCE_THRESHOLD_TOKENS", 4000))
+MAP_REDUCE_MAX_WORKERS = 4
+
+# Signals used to rank paragraphs when an article exceeds the token budget
+FINANCE_KEYWORDS = re.compile(
+    r"revenue|earnings|profit|loss|eps|guidance|forecast|dividend|shares?|stock|market|"
+    r"quarter|growth|margin|billion|million|analyst|rate|inflation|fed|"
+    r"營收|獲利|淨利|虧損|每股|盈餘|財報|股價|股票|股利|季|成長|毛利|億|萬|法人|分析師|利率|通膨|央行",
+    re.I
+)
+BOILERPLATE_PATTERNS = re.compile(
+    r"cookie|subscribe|sign in|log in|newsletter|all rights reserved|copyright|advertisement|"
+    r"privacy policy|terms of (use|service)|登入|註冊|訂閱|版權所有|廣告|隱私權|相關新聞|延伸閱讀|分享",
+    re.I
+)
+# Boilerplate words also occur in real reporting ("subscribers", "廣告營收"), so only lines
+# shorter than this weighted length (CJK characters count triple, as in the paragraph score),
+# i.e. navigation, footers and share buttons, are dropped for containing them
+BOILERPLATE_MAX_LENGTH = 120
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+# Lines shorter than this many tokens (menus, bylines, share buttons) score 0. Counting
+# tokens rather than characters keeps short but complete Chinese paragraphs.
+MIN_PARAGRAPH_TOKENS = 8
+
+_token_encodings = {}
+
+
+def _token_encoding(model):
+    encoding = _token_encodings.get(model)
+    if encoding is None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        _token_encodings[model] = encoding
+    return encoding
+
+
+def count_tokens(text, model="gpt-3.5-turbo"):
+    """
+    Count prompt tokens with tiktoken when installed, otherwise estimate them
+    (one token per CJK character, roughly four characters per token elsewhere).
+    """
+    if tiktoken is not None:
+        return len(_token_encoding(model).encode(text))
+    cjk = len(CJK_PATTERN.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_tokens(text, max_tokens, model="gpt-3.5-turbo"):
+    """
+    The beginning of text that fits in max_tokens tokens.
+    """
+    if tiktoken is not None:
+        encoding = _token_encoding(model)
+        tokens = encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        # A cut inside a multi-byte character decodes to U+FFFD; drop it
+        return encoding.decode(tokens[:max_tokens]).rstrip("\ufffd")
+    used = 0.0
+    for i, char in enumerate(text):
+        used += 1.0 if CJK_PATTERN.match(char) else 0.25
+        if used > max_tokens:
+            return text[:i]
+    return text
+
+
+def _paragraph_score(paragraph, position, total, tokens=None):
+    """
+    Heuristic informativeness of one paragraph: longer, number-heavy, finance-related
+    text near the top of the article ranks highest; short navigation lines and
+    boilerplate rank lowest.
+    """
+    if tokens is None:
+        tokens = count_tokens(paragraph)
+    length = len(CJK_PATTERN.findall(paragraph)) * 3 + len(paragraph)
+    if tokens < MIN_PARAGRAPH_TOKENS or (length < BOILERPLATE_MAX_LENGTH and BOILERPLATE_PATTERNS.search(paragraph)):
+        return 0.0
+    score = math.log(length)
+    score += 0.5 * min(len(re.findall(r"\d+(?:[.,]\d+)?%?", paragraph)), 6)
+    score += 0.8 * min(len(FINANCE_KEYWORDS.findall(paragraph)), 5)
+    # Mild preference for the lead of the article
+    score += 1.0 - position / max(total, 1)
+    return score
+
+
+def select_informative_paragraphs(text, max_tokens=MAX_INPUT_TOKENS, model="gpt-3.5-turbo"):
+    """
+    Fit an article into max_tokens by keeping its most informative paragraphs
+    (in their original order) instead of cutting it at a fixed character offset.
+    Articles without any informative paragraph (e.g. only short lines) keep their
+    leading lines instead, so the budget is always used.
+    """
+    if count_tokens(text, model) <= max_tokens:
+        return text
+
+    # Drop exact duplicate lines (repeated menus, captions) before ranking
+    seen = set()
+    paragraphs = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line and line not in seen:
+            seen.add(line)
+            paragraphs.append(line)
+    if not paragraphs:
+        return ""
+
+    tokens = [count_tokens(p, model) for p in paragraphs]
+    scores = [_paragraph_score(p, i, len(paragraphs), tokens[i]) for i, p in enumerate(paragraphs)]
+    ranked = sorted(range(len(paragraphs)), key=lambda i: scores[i], reverse=True)
+    chosen = []
+    used = 0
+    for i in ranked:
+        if scores[i] <= 0:
+            # Navigation lines and boilerplate are never worth the tokens
+            break
+        if used + tokens[i] + 1 > max_tokens:
+            continue
+        chosen.append(i)
+        used += tokens[i] + 1
+        if max_tokens - used < 20:
+            break
+
+    if chosen:
+        return "\n".join(paragraphs[i] for i in sorted(chosen))
+    if scores[ranked[0]] > 0:
+        # Nothing fits (e.g. one huge paragraph): keep the beginning of the best one
+        return truncate_tokens(paragraphs[ranked[0]], max_tokens, model)
+
+    # Nothing looks informative: keep the lead of the article, as much as fits
+    return truncate_tokens("\n".join(paragraphs), max_tokens, model)
+
+
+def split_into_chunks(text, chunk_tokens=MAX_INPUT_TOKENS, model="gpt-3.5-turbo"):
+    """
+    Split text on line boundaries into chunks of at most ~chunk_tokens tokens.
+    """
+    chunks = []
+    current = []
+    used = 0
+    for line in text.splitlines():
+        tokens = count_tokens(line, model) + 1
+        if current and used + tokens > chunk_tokens:
+            chunks.append("\n".join(current))
+            current, used = [], 0
+        current.append(line)
+        used += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+class AdviceStreamError(RuntimeError):
+    """
+    Raised by generate_advice_stream when no advice could be generated. The text
+    streamed so far (if any) is incomplete and must not be kept as the advice.
+    """
+
+
+class HostRateLimiter:
+    """
+    Thread-safe per-host rate limit: requests to the same host are spaced at
+    least min_interval seconds apart, requests to different hosts do not wait.
+    """
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, url):
+        """
+        Claim the next slot for the URL's host.
+        Returns: seconds to wait before sending the request
+        """
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        return slot - now
+
+    def wait(self, url):
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class SingleFlight:
+    """
+    Request coalescing: while a call for a key is in flight, further calls with the same
+    key wait for it and share its result (or exception) instead of starting their own.
+    Nothing is kept once the call completes; repeated calls are the caches' job.
+    Every caller gets its own deep copy of the result, so it may mutate what it gets back.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key):
+        """
+        Join the in-flight call for key, or start it.
+        Returns: (future, leader); only the leader runs the call, and must report it with finish()
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def finish(self, key, result=None, error=None):
+        """
+        Hand the leader's result (or exception) to the callers waiting on key.
+        """
+        with self._lock:
+            future = self._calls.pop(key)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, func, *args, **kwargs):
+        future, leader = self.begin(key)
+        if not leader:
+            annotate(cache="shared")
+            return copy.deepcopy(future.result())
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            self.finish(key, error=e)
+            raise
+        self.finish(key, result)
+        return copy.deepcopy(result)
+
+
+# Process-wide, so identical requests from different sessions (and analyzers) are coalesced too
+_in_flight = SingleFlight()
+
+
+def coalesced(make_key):
+    """
+    Method decorator: concurrent calls with the same make_key(self, *args) share one computation.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            return _in_flight.do(make_key(self, *args, **kwargs), func, self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Blocking:
+    """
+    Stage step: a blocking local call (cache or index access, tokenizing, parsing, the
+    local sentiment model). Sends back its return value.
+    """
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+
+class Chat:
+    """
+    Stage step: one chat-completion request with the given arguments (besides model).
+    Sends back the response.
+    """
+
+    def __init__(self, **request):
+        self.request = request
+
+
+class Call:
+    """
+    Stage step: a method of the driving analyzer by name, so nested stages
+    ("analyze_sentiment", "_prepare_text") keep their coalescing and instrumentation.
+    """
+
+    def __init__(self, name, *args):
+        self.name = name
+        self.args = args
+
+
+class Gather:
+    """
+    Stage step: several steps or stage generators run concurrently (at most max_workers
+    threads in the blocking driver). Sends back their results in order.
+    """
+
+    def __init__(self, steps, max_workers=8):
+        self.steps = list(steps)
+        self.max_workers = max_workers
+
+
+class PageReader:
+    """
+    Incremental reader for one streamed response body: chunks are decoded with the
+    page's charset and counted (decompressed) against MAX_DOWNLOAD_BYTES, or a smaller
+    Content-Length for uncompressed bodies.
+    With the "stream" extractor the HTML is parsed as it arrives and reading stops as
+    soon as enough article text has been collected; other engines get the buffered body.
+    Used by both the blocking and the asyncio download paths.
+    """
+
+    def __init__(self, headers, extractor, max_bytes=MAX_DOWNLOAD_BYTES):
+        self.content_type = headers.get("Content-Type", "")
+        # Bodies declared larger than the budget are still read, but only up to the budget.
+        # Chunks arrive decompressed, so a Content-Length only bounds them without Content-Encoding.
+        self.budget = max_bytes
+        content_length = headers.get("Content-Length")
+        encoding = headers.get("Content-Encoding", "identity").strip().lower()
+        if content_length and content_length.isdigit() and encoding in ("", "identity"):
+            self.budget = min(self.budget, int(content_length))
+        self.parser = StreamingTextExtractor(max_chars=EXTRACT_MAX_CHARS) if extractor == "stream" else None
+        self.decoder = None
+        self.parts = []
+        self.received = 0
+
+    def feed(self, chunk):
+        """
+        Add one chunk. Returns True once no more input is needed.
+        """
+        if self.decoder is None:
+            self.decoder = self.make_decoder(self.content_type, chunk)
+        chunk = chunk[:self.budget - self.received]
+        self.received += len(chunk)
+        annotate(bytes=len(chunk))
+        html = self.decoder.decode(chunk)
+        if self.parser is not None:
+            self.parser.feed(html)
+            if self.parser.done:
+                return True
+        else:
+            self.parts.append(html)
+        return self.received >= self.budget
+
+    def streamed_text(self):
+        """
+        Article text collected by the streaming parser, or None for other engines.
+        """
+        if self.parser is None:
+            return None
+        self.parser.close()
+        return self.parser.get_text()
+
+    def html(self):
+        return "".join(self.parts)
+
+    @staticmethod
+    def make_decoder(content_type, first_chunk):
+        """
+        Incremental decoder for the charset in the Content-Type header, falling back to
+        a <meta charset> declaration in the first chunk, then UTF-8.
+        """
+        match = re.search(r"charset=[\"']?([\w-]+)", content_type, re.I)
+        if not match:
+            match = re.search(rb"<meta[^>]+charset=[\"']?([\w-]+)", first_chunk[:4096], re.I)
+        encoding = match.group(1) if match else "utf-8"
+        if isinstance(encoding, bytes):
+            encoding = encoding.decode("ascii")
+        try:
+            return codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            return codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+
+# Connection pool / retry settings for the shared OpenAI client
+DEFAULT_CLIENT_OPTIONS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 60.0,
+    "timeout": 60.0,
+    "max_retries": 3
+}
+
+# One long-lived client per (api_key, base_url, options), shared across analyzers and Streamlit reruns;
+# only the most recently used OPENAI_CLIENT_CACHE_SIZE are kept (every visitor may bring their own key)
+OPENAI_CLIENT_CACHE_SIZE = int(os.getenv("OPENAI_CLIENT_CACHE_SIZE", 32))
+_openai_clients = OrderedDict()
+_openai_clients_lock = threading.Lock()
+
+
+def openai_client_key(api_key, base_url, options):
+    """
+    Cache key of a pooled client; the API key is hashed so it is not held as a dict key.
+    """
+    credentials = hashlib.sha256(f"{api_key}\0{base_url}".encode("utf-8")).hexdigest()
+    return credentials, tuple(sorted(options.items()))
+
+
+def remember_client(clients, key, client):
+    """
+    Add a client to an LRU OrderedDict, dropping the least recently used beyond OPENAI_CLIENT_CACHE_SIZE.
+    Evicted clients are not closed here (a request may still be using one); they close once unreferenced.
+    """
+    clients[key] = client
+    while len(clients) > OPENAI_CLIENT_CACHE_SIZE:
+        clients.popitem(last=False)
+
+
+def get_openai_client(api_key, base_url=None, **options):
+    """
+    Return a shared OpenAI client with a pooled keep-alive HTTP connection.
+    Clients are created once per API key / base URL / options and reused afterwards.
+    Retries use the OpenAI SDK's built-in exponential backoff (max_retries).
+    """
+    options = {**DEFAULT_CLIENT_OPTIONS, **options}
+    key = openai_client_key(api_key, base_url, options)
+    with _openai_clients_lock:
+        client = _openai_clients.get(key)
+        if client is not None:
+            _openai_clients.move_to_end(key)
+            return client
+        http_client = openai.DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=options["max_connections"],
+                max_keepalive_connections=options["max_keepalive_connections"],
+                keepalive_expiry=options["keepalive_expiry"]
+            ),
+            timeout=options["timeout"]
+        )
+        client = openai.OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=http_client,
+            max_retries=options["max_retries"]
+        )
+        remember_client(_openai_clients, key, client)
+        return client
+
+
 class FinancialAnalyzer:
-    def __init__(self, api_key=None, model_provider="openai"):
+    def __init__(self, api_key=None, model_provider="openai", base_url=None, client_options=None,
+                 model="gpt-3.5-turbo", cache=None, fetch_cache=None, extractor="auto",
+                 max_input_tokens=MAX_INPUT_TOKENS, long_document_mode=LONG_DOCUMENT_MODE,
+                 watchlist=None, feeds=None, json_mode=JSON_MODE, entity_index=None, similarity_index=None):
         # Try to get API key from env if not provided
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model_provider = model_provider
+        self.model = model
+        self.json_mode = json_mode
+        # HTML-to-text engine, see text_extractor.EXTRACTORS
+        self.extractor = extractor
+        # Prompt preprocessing: token budget per article, and "truncate" (pick the most
+        # informative paragraphs) or "map_reduce" (summarise long articles chunk by chunk first)
+        self.max_input_tokens = max_input_tokens
+        self.long_document_mode = long_document_mode
+        # Market overview symbols {symbol: display name}
+        self.watchlist = dict(watchlist or DEFAULT_WATCHLIST)
+        # Trending news sources, fetched in parallel and de-duplicated (see news_feeds.DEFAULT_FEEDS)
+        self.feed_aggregator = FeedAggregator(feeds, session=get_http_session())
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        # Overrides for DEFAULT_CLIENT_OPTIONS (pool limits, keep-alive, timeout, max_retries)
+        self.client_options = client_options or {}
+
+        # Symbol table for canonical tickers: None -> shared index from symbols.json, False -> disabled
+        if entity_index is None:
+            try:
+                entity_index = get_entity_index()
+            except (OSError, ValueError) as e:
+                print(f"Entity index unavailable: {e}")
+                entity_index = False
+        self.entity_index = entity_index if entity_index is not False else None
+
+        # LLM result cache: None -> default on-disk cache, False -> disabled
+        if cache is None:
+            cache = ResultCache(CACHE_PATH, namespace="llm", ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+        self.cache = cache if cache is not False else None
+
+        # Near-duplicate article index, same None / False convention (only useful with a cache)
+        if similarity_index is None:
+            similarity_index = get_similarity_index(SIMHASH_INDEX_PATH) if self.cache is not None else False
+        self.similarity_index = similarity_index if similarity_index is not False else None
+        self._content_keys = {}
+        self.duplicate_hits = 0
+
+        # Scraped page cache (extracted text + ETag / Last-Modified), same None / False convention
+        if fetch_cache is None:
+            fetch_cache = ResultCache(CACHE_PATH, namespace="http", ttl=FETCH_CACHE_TTL,
+                                      max_entries=FETCH_CACHE_MAX_ENTRIES)
+        self.fetch_cache = fetch_cache if fetch_cache is not False else None
+
+        # Google News article links -> publisher URLs, memoized on disk alongside the page cache
+        if self.fetch_cache is not None:
+            self.link_resolver = GoogleNewsResolver(
+                cache=ResultCache(self.fetch_cache.path, namespace="google_news", ttl=GOOGLE_NEWS_CACHE_TTL,
+                                  max_entries=GOOGLE_NEWS_CACHE_MAX_ENTRIES),
+                failure_cache=ResultCache(self.fetch_cache.path, namespace="google_news_failed",
+                                          ttl=GOOGLE_NEWS_FAILURE_TTL, max_entries=GOOGLE_NEWS_CACHE_MAX_ENTRIES)
+            )
+        else:
+            self.link_resolver = GoogleNewsResolver()
         
         # Initialize FinBERT pipeline
         # Lazy loading: Don't load it here to save memory on startup
         self.sentiment_pipeline = None
+        self._sentiment_pipeline_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """
+        Shared, pooled OpenAI client for this analyzer's API key.
+        """
+        return get_openai_client(self.api_key, base_url=self.base_url, **self.client_options)
+
+    def _cache_key(self, kind, text, *extra):
+        """
+        Content-addressed key: normalized article text + prompt version + model name.
+        """
+        return make_cache_key(PROMPT_VERSION, self.model, kind, self._content_key(text), *extra)
 
+    def _flight_key(self, kind, text, *extra):
+        """
+        Identity of an in-flight computation for request coalescing: what its cache key covers plus
+        the settings that change the result without being part of that key. Calls are only
+        shared between analyzers with the same credentials and endpoint, so nobody gets
+        another user's auth / quota error or is billed to another user's key.
+        """
+        credentials = hashlib.sha256(f"{self.api_key}\0{self.base_url}".encode("utf-8")).hexdigest()
+        # The exact text digest rather than _content_key: cheap enough to compute on an event loop,
+        # and near-duplicates are rarely analyzed at the same moment
+        return (self.model_provider, credentials, PROMPT_VERSION, self.model, kind,
+                content_digest(text).hex(), *extra)
+
+    def _content_key(self, text):
+        """
+        Identity of an article for caching. With a similarity index, near-duplicates
+        (the same wire story on another site) map to the digest of the copy seen first,
+        so its cached analyses are reused instead of calling the LLM again.
+        """
+        if self.similarity_index is None:
+            return normalize_text(text)
+        key = self._content_keys.get(text)
+        if key is None:
+            digest = self.similarity_index.canonical_digest(text)
+            if digest != content_digest(text):
+                self.duplicate_hits += 1
+            key = digest.hex()
+            if len(self._content_keys) >= 256:
+                self._content_keys.clear()
+            self._content_keys[text] = key
+        return key
+
+    def _cache_get(self, key):
+        if self.cache is None:
+            return None
+        value = self.cache.get(key)
+        annotate(cache="miss" if value is None else "hit")
+        return value
+
+    def _cache_set(self, key, value):
+        if self.cache is not None:
+            self.cache.set(key, value)
+
+    def _cache_lookup(self, kind, text, *extra):
+        """
+        Returns: (cache key, cached result or None)
+        """
+        key = self._cache_key(kind, text, *extra)
+        return key, self._cache_get(key)
+
+    def _run(self, steps):
+        """
+        Drive a stage generator (the *_steps methods, shared with AsyncFinancialAnalyzer)
+        with blocking I/O: every yielded step is performed in this thread and its result,
+        or exception, is sent back into the generator.
+        """
+        value = error = None
+        while True:
+            try:
+                step = steps.send(value) if error is None else steps.throw(error)
+            except StopIteration as stop:
+                return stop.value
+            value = error = None
+            try:
+                value = self._perform(step)
+            except Exception as e:
+                error = e
+
+    def _perform(self, step):
+        if inspect.isgenerator(step):
+            return self._run(step)
+        if isinstance(step, Blocking):
+            return step.func(*step.args)
+        if isinstance(step, Chat):
+            response = self.client.chat.completions.create(model=self.model, **step.request)
+            record_usage(response)
+            return response
+        if isinstance(step, Call):
+            return getattr(self, step.name)(*step.args)
+        if isinstance(step, Gather):
+            if not step.steps:
+                return []
+            with ThreadPoolExecutor(max_workers=min(step.max_workers, len(step.steps))) as executor:
+                futures = [executor.submit(propagate(self._perform), item) for item in step.steps]
+                return [future.result() for future in futures]
+        raise TypeError(f"Unknown stage step: {step!r}")
+
+    def cache_stats(self):
+        """
+        Hit/miss counters of the LLM result cache.
+        """
+        if self.cache is None:
+            return {"hits": 0, "misses": 0, "hit_rate": 0.0, "size": 0, "duplicates": 0}
+        return dict(self.cache.stats(), duplicates=self.duplicate_hits)
+
+    @instrumented("fetch")
+    @coalesced(lambda self, url: ("fetch", self.extractor, url))
     def fetch_news_from_url(self, url):
         """
         Fetches news content from a given URL.
         """
         try:
-            # Block social media URLs that require login
-            if any(x in url.lower() for x in ["facebook.com", "twitter.com", "instagram.com", "youtube.com"]):
-                return "Error: 無法分析社群媒體連結 (需要登入或內容受限)。請選擇新聞網站連結。"
+            url, error = self._resolve_article_url(url)
+            if error:
+                return error
 
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            
-            # Use a session to ensure settings are applied
-            session = requests.Session()
-            session.verify = False
-            session.headers.update(headers)
-            
-            response = session.get(url, timeout=10)
-            response.raise_for_status()
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-                
-            # Get text
-            text = soup.get_text()
-            
-            # Break into lines and remove leading/trailing space on each
-            lines = (line.strip() for line in text.splitlines())
-            # Break multi-headlines into a line each
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            # Drop blank lines
-            text = '\n'.join(chunk for chunk in chunks if chunk)
-            
+            cached, headers = self._cached_page(url)
+            if cached and time.time() - cached["fetched_at"] < FETCH_CACHE_FRESH:
+                annotate(cache="hit")
+                return cached["text"]
+
+            with get_http_session().get(url, headers=headers, timeout=10, stream=True) as response:
+                if response.status_code == 304 and cached:
+                    return self._revalidated_page(url, cached)
+                response.raise_for_status()
+
+                error = self._content_type_error(response.headers)
+                if error:
+                    return error
+
+                text = self._download_text(response)
+
+            self._store_page(url, text, response.headers)
             return text
         except Exception as e:
+            record_error(e)
             return f"Error fetching URL: {str(e)}"
 
+    def _resolve_article_url(self, url):
+        """
+        The page to scrape for a news link.
+        Returns: (url, None), or (None, error message) for links that cannot be analyzed
+        """
+        # Block social media URLs that require login
+        if any(x in url.lower() for x in ["facebook.com", "twitter.com", "instagram.com", "youtube.com"]):
+            annotate(error="BlockedURL")
+            return None, "Error: 無法分析社群媒體連結 (需要登入或內容受限)。請選擇新聞網站連結。"
+
+        # Google News links only lead to a redirect page; scrape the publisher's article instead
+        if is_google_news_url(url):
+            resolved = self.link_resolver.resolve(url)
+            if not resolved:
+                annotate(error="UnresolvedLink")
+                return None, "Error: 無法解析 Google 新聞連結，請改用原始新聞網站連結。"
+            url = resolved
+        return url, None
+
+    def _cached_page(self, url):
+        """
+        Returns: (cached page or None, conditional request headers to revalidate it)
+        """
+        cached = self.fetch_cache.get(url) if self.fetch_cache is not None else None
+        # Revalidate a stale cache entry instead of downloading the page again
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        return cached, headers
+
+    def _revalidated_page(self, url, cached):
+        annotate(cache="revalidated")
+        cached["fetched_at"] = time.time()
+        self.fetch_cache.set(url, cached)
+        return cached["text"]
+
+    @staticmethod
+    def _content_type_error(headers):
+        content_type = headers.get("Content-Type", "")
+        if content_type and not content_type.lower().startswith(TEXT_CONTENT_TYPES):
+            annotate(error="UnsupportedContentType")
+            return f"Error: 不支援的內容類型 ({content_type.split(';')[0]})，請提供新聞網頁連結。"
+        return None
+
+    def _store_page(self, url, text, headers):
+        if self.fetch_cache is not None:
+            self.fetch_cache.set(url, {
+                "text": text,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "fetched_at": time.time()
+            })
+
+    @instrumented("download")
+    def _download_text(self, response):
+        """
+        Stream the response body in chunks (see PageReader), stopping at MAX_DOWNLOAD_BYTES
+        or, with the "stream" extractor, as soon as enough article text has been collected.
+        """
+        reader = PageReader(response.headers, self.extractor)
+        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+            if reader.feed(chunk):
+                break
+        text = reader.streamed_text()
+        return text if text is not None else self._extract_text(reader.html())
+
+    @instrumented("parse")
+    def _extract_text(self, html):
+        """
+        Extract readable article text from an HTML page with the configured engine.
+        """
+        return extract_text(html, engine=self.extractor, max_chars=EXTRACT_MAX_CHARS)
+
+    @instrumented("prepare")
+    def _prepare_text(self, text):
+        """
+        Fit the article into the prompt token budget.
+        """
+        return self._run(self._prepare_steps(text))
+
+    def _prepare_steps(self, text):
+        if (self.long_document_mode == "map_reduce" and self.api_key
+                and (yield Blocking(count_tokens, text, self.model)) > MAP_REDUCE_THRESHOLD_TOKENS):
+            text = yield Call("summarize_long_text", text)
+        return (yield Blocking(select_informative_paragraphs, text, self.max_input_tokens, self.model))
+
+    def _tag_entities(self, text):
+        """
+        Canonical tickers of known companies mentioned in the text (empty without an entity index).
+        """
+        return list(self.entity_index.tag(text)) if self.entity_index else []
+
+    def _entity_hint(self, tagged):
+        """
+        Prompt lines listing pre-tagged entities as candidates for the model to confirm:
+        a lexicon match can be a common word ("統一標準" is not 統一企業).
+        """
+        if not tagged:
+            return ""
+        known = "、".join(f"{self.entity_index.name_of(t)} ({t})" for t in tagged)
+        return (f"本地字典比對到的候選公司（代號已標準化）：{known}。候選可能只是一般詞語（例如「統一標準」、「發揮創意」），"
+                "只有新聞確實提及該公司時，才以上列名稱與代號列入 company_name 與 stock_code；另請補上文中其他公司。")
+
+    def _merge_entities(self, info, tagged):
+        """
+        Add canonical tickers for the companies the model returned, candidates it confirmed
+        first (in order of mention). Candidates the model did not return are dropped.
+        """
+        if not self.entity_index or "error" in info:
+            return info
+        info = self.entity_index.normalize_info(info)
+        confirmed = [t for t in tagged if t in info["tickers"]]
+        info["tickers"] = confirmed + [t for t in info["tickers"] if t not in confirmed]
+        return info
+
+    @instrumented("summarize")
+    @coalesced(lambda self, text: self._flight_key("summary", text, self.max_input_tokens))
+    def summarize_long_text(self, text):
+        """
+        Map-reduce summary of a long article: chunks are summarised in parallel and the
+        partial summaries are merged, keeping companies, tickers, figures and events.
+        """
+        return self._run(self._summary_steps(text))
+
+    def _summary_steps(self, text):
+        cache_key, cached = yield Blocking(self._cache_lookup, "summary", text, self.max_input_tokens)
+        if cached is not None:
+            return cached
+
+        chunks = yield Blocking(split_into_chunks, text, self.max_input_tokens, self.model)
+        try:
+            summaries = yield Gather((self._chunk_summary_steps(chunk) for chunk in chunks), MAP_REDUCE_MAX_WORKERS)
+        except Exception as e:
+            record_error(e)
+            print(f"Error summarizing long article, falling back to paragraph selection: {e}")
+            return text
+        summary = "\n".join(summaries)
+        yield Blocking(self._cache_set, cache_key, summary)
+        return summary
+
+    def _chunk_summary_steps(self, chunk):
+        response = yield Chat(messages=self._summary_messages(chunk), temperature=0)
+        return response.choices[0].message.content.strip()
+
+    def _summary_messages(self, chunk):
+        prompt = f"""
+        請以繁體中文摘要以下財經新聞片段，保留所有公司名稱、股票代號、財務數字、時間與重大事件，不要加入評論。
+
+        新聞片段：
+        {chunk}
+        """
+        return [
+            {"role": "system", "content": "You are a precise financial news summarizer."},
+            {"role": "user", "content": prompt}
+        ]
+
+    def _chat_json_steps(self, system_prompt, prompt):
+        """
+        Request a JSON reply, using the provider's JSON mode when available, and parse it
+        with the tolerant parser (code fences, surrounding prose, trailing commas, truncation).
+        """
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ]
+        if self.json_mode:
+            try:
+                response = yield Chat(messages=messages, temperature=0, response_format={"type": "json_object"})
+                return parse_json_lenient(response.choices[0].message.content)
+            except openai.BadRequestError as e:
+                if "response_format" not in str(e):
+                    raise
+                # Model or endpoint without JSON mode: remember that and rely on the prompt instead
+                self.json_mode = False
+
+        response = yield Chat(messages=messages, temperature=0)
+        return parse_json_lenient(response.choices[0].message.content)
+
+    def get_sentiment_pipeline(self):
+        """
+        Lazily load the local sentiment model used when model_provider="local"
+        (see local_sentiment.LOCAL_SENTIMENT_MODEL).
+        """
+        with self._sentiment_pipeline_lock:
+            if self.sentiment_pipeline is None:
+                self.sentiment_pipeline = load_sentiment_model()
+            return self.sentiment_pipeline
+
+    def analyze_sentiment_batch(self, texts):
+        """
+        Score many texts at once. The local model runs them as one CPU batch;
+        the OpenAI provider falls back to concurrent analyze_sentiment calls.
+        Returns: list of (label, score) in input order
+        """
+        return self._run(self._sentiment_batch_steps(texts))
+
+    def _sentiment_batch_steps(self, texts):
+        texts = list(texts)
+        if self.model_provider == "local":
+            model = yield Blocking(self.get_sentiment_pipeline)
+            return (yield Blocking(model.predict_batch, texts))
+        return (yield Gather(Call("analyze_sentiment", text) for text in texts))
+
+    @instrumented("headlines")
+    def score_headlines(self, titles):
+        """
+        Pre-score many headlines at once for the trending grid.
+        With model_provider="local" (or without an API key) the local model scores them
+        in one CPU batch; otherwise uncached titles are sent in batched LLM requests
+        (per HEADLINE_BATCH_SIZE titles, concurrently) and each result is cached by title hash.
+        Returns: dict {title: (label, score)}
+        """
+        return self._run(self._headline_steps(titles))
+
+    def _headline_steps(self, titles):
+        titles = list(dict.fromkeys(titles))
+        if self.model_provider == "local" or not self.api_key:
+            model = yield Blocking(self.get_sentiment_pipeline)
+            return dict(zip(titles, (yield Blocking(model.predict_batch, titles))))
+
+        scores, missing = yield Blocking(self._cached_headline_scores, titles)
+        batches = [missing[start:start + HEADLINE_BATCH_SIZE] for start in range(0, len(missing), HEADLINE_BATCH_SIZE)]
+        for batch_scores in (yield Gather(self._headline_batch_steps(batch) for batch in batches)):
+            scores.update(batch_scores)
+        return scores
+
+    def _headline_batch_steps(self, batch):
+        try:
+            result = yield from self._chat_json_steps(
+                "You are a financial sentiment analyst. Output valid JSON only.", self._headline_prompt(batch)
+            )
+            return (yield Blocking(self._headline_scores, result, batch))
+        except Exception as e:
+            record_error(e)
+            print(f"Error scoring headlines: {e}")
+            return {}
+
+    def _cached_headline_scores(self, titles):
+        """
+        Returns: (dict {title: (label, score)} of cached scores, list of titles still to score)
+        """
+        scores = {}
+        missing = []
+        for title in titles:
+            cached = self._cache_get(self._cache_key("headline", title))
+            if cached is not None:
+                scores[title] = tuple(cached)
+            else:
+                missing.append(title)
+        return scores, missing
+
+    @staticmethod
+    def _headline_prompt(batch):
+        numbered = "\n".join(f"{i + 1}. {title}" for i, title in enumerate(batch))
+        return f"""
+        請分析以下每一則財經新聞標題的情緒。
+        請只輸出 JSON 格式：{{"results": [{{"id": 標題編號, "label": "positive" | "neutral" | "negative", "score": 0.0 到 1.0 之間的情緒強度分數}}]}}
+        每一則標題都必須有一筆結果。
+
+        標題：
+        {numbered}
+        """
+
+    def _headline_scores(self, result, batch):
+        """
+        Map a batched headline reply back to its titles, caching each score.
+        """
+        scores = {}
+        for row in result.get("results", []):
+            index = int(row.get("id", 0)) - 1
+            if 0 <= index < len(batch):
+                score = SentimentResult.from_dict(row).as_tuple()
+                scores[batch[index]] = score
+                self._cache_set(self._cache_key("headline", batch[index]), list(score))
+        return scores
+
+    @instrumented("sentiment")
+    @coalesced(lambda self, text: self._flight_key("sentiment", text))
     def analyze_sentiment(self, text):
         """
-        Analyze sentiment using OpenAI (lighter than FinBERT for deployment).
+        Analyze sentiment using OpenAI (lighter than FinBERT for deployment),
+        or on CPU with the local model when model_provider="local".
         Returns: label (positive/neutral/negative), score (confidence)
         """
+        return self._run(self._sentiment_steps(text))
+
+    def _sentiment_steps(self, text):
+        if self.model_provider == "local":
+            model = yield Blocking(self.get_sentiment_pipeline)
+            return (yield Blocking(model.predict, text))
+
         if not self.api_key:
             return "neutral", 0.0
-        
-        truncated_text = text[:4000]
-        
-        prompt = f"""
+
+        cache_key, cached = yield Blocking(self._cache_lookup, "sentiment", text)
+        if cached is not None:
+            return tuple(cached)
+
+        truncated_text = yield Call("_prepare_text", text)
+
+        try:
+            result = yield from self._chat_json_steps(
+                "You are a financial sentiment analyst. Output valid JSON only.", self._sentiment_prompt(truncated_text)
+            )
+            label, score = SentimentResult.from_dict(result).as_tuple()
+            yield Blocking(self._cache_set, cache_key, [label, score])
+            return label, score
+        except Exception as e:
+            record_error(e)
+            print(f"Error in sentiment analysis: {e}")
+            return "neutral", 0.0
+
+    @staticmethod
+    def _sentiment_prompt(truncated_text):
+        return f"""
         請分析以下財經新聞的情緒。
         請只輸出 JSON 格式，包含兩個欄位：
         - label: "positive", "neutral", 或 "negative"
@@ -84,82 +1110,146 @@ class FinancialAnalyzer:
         {truncated_text}
         """
 
-        try:
-            client = openai.OpenAI(api_key=self.api_key)
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a financial sentiment analyst. Output valid JSON only."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0
-            )
-            content = response.choices[0].message.content
-            # Clean up code blocks
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-                
-            result = json.loads(content.strip())
-            return result.get("label", "neutral"), result.get("score", 0.5)
-        except Exception as e:
-            print(f"Error in sentiment analysis: {e}")
-            return "neutral", 0.0
-
+    @instrumented("info")
+    @coalesced(lambda self, text: self._flight_key("info", text))
     def extract_info(self, text):
         """
         Extract key information using LLM.
         Returns: JSON object or dict
         """
+        return self._run(self._info_steps(text))
+
+    def _info_steps(self, text):
         if not self.api_key:
             return {"error": "API Key is missing (Set OPENAI_API_KEY env var)"}
 
-        # Truncate text for LLM to avoid token limits (simple truncation)
-        truncated_text = text[:4000]
+        cache_key, cached = yield Blocking(self._cache_lookup, "info", text)
+        if cached is not None:
+            return cached
 
-        prompt = f"""
+        # Fit the article into the token budget for the LLM
+        truncated_text = yield Call("_prepare_text", text)
+        tagged = yield Blocking(self._tag_entities, truncated_text)
+
+        try:
+            result = yield from self._chat_json_steps(
+                "You are a helpful financial assistant. Output only valid JSON.", self._info_prompt(truncated_text, tagged)
+            )
+            info = self._merge_entities(ExtractedInfo.from_dict(result).to_dict(), tagged)
+            yield Blocking(self._cache_set, cache_key, info)
+            return info
+        except Exception as e:
+            record_error(e)
+            return {"error": str(e)}
+
+    def _info_prompt(self, truncated_text, tagged):
+        return f"""
         請分析以下財經新聞，並提取關鍵資訊。請務必使用**繁體中文**回答。請以 JSON 格式輸出，包含以下欄位：
         - company_name: 公司名稱 (List of strings)
         - stock_code: 股票代號 (List of strings)
         - financial_data: 財務數據 (Dictionary, e.g., {{"revenue": "...", "eps": "..."}})
         - events: 重大事件 (List of strings)
         - time_info: 時間資訊 (String)
+        {self._entity_hint(tagged)}
 
         新聞內容：
         {truncated_text}
         """
 
-        try:
-            client = openai.OpenAI(api_key=self.api_key)
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a helpful financial assistant. Output only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0
-            )
-            content = response.choices[0].message.content
-            # Clean up code blocks if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-            
-            return json.loads(content.strip())
-        except Exception as e:
-            return {"error": str(e)}
-
+    @instrumented("advice")
+    @coalesced(lambda self, text, sentiment_label: self._flight_key("advice", text, sentiment_label))
     def generate_advice(self, text, sentiment_label):
         """
         Generate investment advice based on text and sentiment.
         """
+        return self._run(self._advice_steps(text, sentiment_label))
+
+    def _advice_steps(self, text, sentiment_label):
         if not self.api_key:
             return "API Key is missing. Cannot generate advice."
 
-        truncated_text = text[:4000]
+        cache_key, cached = yield Blocking(self._cache_lookup, "advice", text, sentiment_label)
+        if cached is not None:
+            return cached
 
+        try:
+            truncated_text = yield Call("_prepare_text", text)
+            response = yield Chat(messages=self._advice_messages(truncated_text, sentiment_label))
+            advice = response.choices[0].message.content
+            yield Blocking(self._cache_set, cache_key, advice)
+            return advice
+        except Exception as e:
+            record_error(e)
+            return f"Error generating advice: {str(e)}"
+
+    @instrumented("advice_stream")
+    def generate_advice_stream(self, text, sentiment_label):
+        """
+        Streaming variant of generate_advice: yields the advice text piece by piece as
+        tokens arrive (cached advice is yielded at once). The full text is cached when done.
+        Raises AdviceStreamError if the advice can't be generated.
+        """
+        if not self.api_key:
+            raise AdviceStreamError("API Key is missing. Cannot generate advice.")
+
+        cache_key, cached = self._cache_lookup("advice", text, sentiment_label)
+        if cached is not None:
+            yield cached
+            return
+
+        # The same advice is already being generated (e.g. for another session): wait and show it at once
+        flight_key = self._flight_key("advice", text, sentiment_label)
+        future, leader = _in_flight.begin(flight_key)
+        if not leader:
+            annotate(cache="shared")
+            try:
+                advice = future.result()
+            except Exception:
+                # The other stream stopped early (e.g. its session went away): generate the advice here
+                yield from self.generate_advice_stream(text, sentiment_label)
+                return
+            yield advice
+            return
+
+        advice = None
+        try:
+            parts = []
+            messages = self._advice_messages(self._prepare_text(text), sentiment_label)
+            try:
+                stream = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    stream=True
+                )
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            except Exception as e:
+                record_error(e)
+                raise AdviceStreamError(f"Error generating advice: {str(e)}") from e
+            advice = "".join(parts)
+            self._store_streamed_advice(cache_key, messages, advice)
+        finally:
+            if advice is None:
+                _in_flight.finish(flight_key, error=RuntimeError("advice stream was interrupted"))
+            else:
+                _in_flight.finish(flight_key, advice)
+
+    def _store_streamed_advice(self, cache_key, messages, advice):
+        """
+        Record token usage of a finished advice stream and cache the advice.
+        """
+        # Streamed responses carry no usage block by default; count the tokens locally
+        annotate(prompt_tokens=sum(count_tokens(m["content"], self.model) for m in messages),
+                 completion_tokens=count_tokens(advice, self.model))
+        self._cache_set(cache_key, advice)
+
+    @staticmethod
+    def _advice_messages(truncated_text, sentiment_label):
         prompt = f"""
         基於以下財經新聞內容以及情緒分析結果（{sentiment_label}），請給出結構化的投資建議。請務必使用**繁體中文**回答。
         建議應包含：
@@ -170,79 +1260,334 @@ class FinancialAnalyzer:
         新聞內容：
         {truncated_text}
         """
+        return [
+            {"role": "system", "content": "You are a professional investment advisor."},
+            {"role": "user", "content": prompt}
+        ]
+
+    @instrumented("analyze_all")
+    @coalesced(lambda self, text: self._flight_key("all", text))
+    def analyze_all(self, text):
+        """
+        Run sentiment, extraction and advice in a single chat-completion request.
+        Returns: dict {sentiment: (label, score), info: dict, advice: str},
+        using the same shapes as analyze_sentiment / extract_info / generate_advice.
+        """
+        return self._run(self._all_steps(text))
+
+    def _all_steps(self, text):
+        if not self.api_key:
+            return {
+                "sentiment": (yield Call("analyze_sentiment", text)),
+                "info": {"error": "API Key is missing (Set OPENAI_API_KEY env var)"},
+                "advice": "API Key is missing. Cannot generate advice."
+            }
+
+        cache_key, cached = yield Blocking(self._cache_lookup, "all", text)
+        if cached is not None:
+            cached["sentiment"] = tuple(cached["sentiment"])
+            if self.model_provider == "local":
+                cached["sentiment"] = yield Call("analyze_sentiment", text)
+            return cached
+
+        truncated_text = yield Call("_prepare_text", text)
+        tagged = yield Blocking(self._tag_entities, truncated_text)
 
         try:
-            client = openai.OpenAI(api_key=self.api_key)
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a professional investment advisor."},
-                    {"role": "user", "content": prompt}
-                ]
+            result = yield from self._chat_json_steps(
+                "You are a financial analyst and investment advisor. Output only valid JSON.",
+                self._all_prompt(truncated_text, tagged)
             )
-            return response.choices[0].message.content
+            if not isinstance(result, dict):
+                raise ValueError("expected a JSON object")
         except Exception as e:
-            return f"Error generating advice: {str(e)}"
+            record_error(e)
+            print(f"Error in combined analysis: {e}")
+            return self._failed_analysis(e)
+
+        analysis = self._combined_analysis(result, tagged)
+        yield Blocking(self._cache_set, cache_key, analysis)
+        if self.model_provider == "local":
+            # The local model is authoritative for sentiment; the LLM still supplies info and advice
+            analysis["sentiment"] = yield Call("analyze_sentiment", text)
+        return analysis
+
+    def _all_prompt(self, truncated_text, tagged):
+        return f"""
+        請分析以下財經新聞，並一次完成情緒分析、關鍵資訊提取與投資建議。請務必使用**繁體中文**回答。
+        請只輸出 JSON 格式，包含以下欄位：
+        - sentiment: 物件，包含 label ("positive", "neutral", 或 "negative") 與 score (0.0 到 1.0 之間的情緒強度分數)
+        - company_name: 公司名稱 (List of strings)
+        - stock_code: 股票代號 (List of strings)
+        - financial_data: 財務數據 (Dictionary, e.g., {{"revenue": "...", "eps": "..."}})
+        - events: 重大事件 (List of strings)
+        - time_info: 時間資訊 (String)
+        - advice: 基於新聞內容與上述情緒的結構化投資建議 (String)，應包含：
+          1. 短期觀察重點
+          2. 長期投資潛力
+          3. 風險提示
+        {self._entity_hint(tagged)}
+
+        新聞內容：
+        {truncated_text}
+        """
+
+    @staticmethod
+    def _failed_analysis(error):
+        return {
+            "sentiment": ("neutral", 0.0),
+            "info": {"error": str(error)},
+            "advice": f"Error generating advice: {str(error)}"
+        }
+
+    def _combined_analysis(self, result, tagged):
+        """
+        Split a combined reply into the analyze_all result shape.
+        """
+        sentiment = result.pop("sentiment", None) or {}
+        advice = result.pop("advice", "")
+        if isinstance(advice, dict):
+            advice = "\n".join(f"{key}: {value}" for key, value in advice.items())
+        elif isinstance(advice, list):
+            advice = "\n".join(str(item) for item in advice)
+        return {
+            "sentiment": SentimentResult.from_dict(sentiment).as_tuple(),
+            "info": self._merge_entities(ExtractedInfo.from_dict(result).to_dict(), tagged),
+            "advice": advice
+        }
+
+    @instrumented("pipeline")
+    def analyze_pipeline(self, text, progress_callback=None, include_advice=True):
+        """
+        Run the analysis stages concurrently: sentiment and extraction are fanned out
+        together, and advice starts as soon as the sentiment label is available.
+        progress_callback(stage, result) is called from the calling thread when each
+        stage ("sentiment", "info", "advice") finishes, so it may safely update UI widgets.
+        With include_advice=False the advice stage is skipped (e.g. to stream it separately
+        with generate_advice_stream).
+        Returns: dict {sentiment: (label, score), info: dict, advice: str}
+        """
+        # Preprocess once up front rather than once per concurrent stage
+        text = self._prepare_text(text)
+        results = {}
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            stages = {
+                executor.submit(propagate(self._perform), step): stage
+                for stage, step in self._pipeline_stages(text, include_advice=include_advice)
+            }
+            pending = set(stages)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = stages[future]
+                    results[stage] = future.result()
+                    for next_stage, step in self._pipeline_stages(text, stage, results[stage], include_advice):
+                        next_future = executor.submit(propagate(self._perform), step)
+                        stages[next_future] = next_stage
+                        pending.add(next_future)
+
+                    if progress_callback:
+                        progress_callback(stage, results[stage])
+        return results
+
+    @staticmethod
+    def _pipeline_stages(text, finished=None, result=None, include_advice=True):
+        """
+        The pipeline's stage graph, shared by both backends: the stages to start first
+        (finished=None), or those a finished stage unlocks (advice needs the sentiment label).
+        Returns: list of (stage name, Call step)
+        """
+        if finished is None:
+            return [("sentiment", Call("analyze_sentiment", text)), ("info", Call("extract_info", text))]
+        if finished == "sentiment" and include_advice:
+            label = result[0]
+            return [("advice", Call("generate_advice", text, SENTIMENT_LABELS_ZH.get(label, label)))]
+        return []
+
+    @instrumented("analyze_url")
+    def analyze_url(self, url, mode="all"):
+        """
+        Fetch one URL and analyze it.
+        mode: "all" (single combined request) or "pipeline" (concurrent stages).
+        Returns: dict {url, sentiment, info, advice} or {url, error}
+        """
+        text = self.fetch_news_from_url(url)
+        if text.startswith("Error"):
+            return {"url": url, "error": text}
+        analysis = self.analyze_all(text) if mode == "all" else self.analyze_pipeline(text)
+        return {"url": url, **analysis}
+
+    def analyze_batch(self, urls, concurrency=4, per_host_interval=1.0, mode="all"):
+        """
+        Analyze many URLs with bounded concurrency and a per-host rate limit.
+        Yields result dicts (see analyze_url) in completion order as soon as each is ready,
+        each with an extra "elapsed" field in seconds.
+        """
+        limiter = HostRateLimiter(per_host_interval)
 
+        def run(url):
+            limiter.wait(url)
+            start = time.perf_counter()
+            try:
+                result = self.analyze_url(url, mode=mode)
+            except Exception as e:
+                result = {"url": url, "error": f"Error analyzing URL: {str(e)}"}
+            result["elapsed"] = round(time.perf_counter() - start, 3)
+            return result
+
+        urls = iter(urls)
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # Keep a bounded number of jobs in flight so huge inputs are consumed lazily
+            pending = set()
+            for url in urls:
+                pending.add(executor.submit(propagate(run), url))
+                if len(pending) >= concurrency * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    @instrumented("trending")
     def fetch_trending_news(self, limit=5):
         """
-        Fetch trending financial news from Yahoo Finance RSS.
-        Returns: List of dicts {title, link, published}
+        Fetch trending financial news from all configured RSS feeds (in parallel),
+        de-duplicated by URL and near-duplicate headline and ranked by coverage and recency.
+        Returns: List of dicts {title, link, published, source, sources}
         """
-        # Yahoo Finance RSS
-        rss_url = "https://finance.yahoo.com/news/rssindex"
         try:
-            feed = feedparser.parse(rss_url)
-            news_items = []
-            
-            # Blocked domains that are hard to scrape or require login
-            blocked_domains = ["facebook.com", "twitter.com", "instagram.com", "youtube.com", "login"]
-            
-            for entry in feed.entries:
-                # Check if link contains any blocked domain
-                if any(domain in entry.link.lower() for domain in blocked_domains):
-                    continue
-                
-                news_items.append({
-                    "title": entry.title,
-                    "link": entry.link,
-                    "published": entry.published
-                })
-                
-                if len(news_items) >= limit:
-                    break
-                    
-            return news_items
+            pool = self.feed_aggregator.get_pool()
+
+            # Resolve Google News links to publisher URLs in one batch (mostly cache / offline hits)
+            resolved = self.link_resolver.resolve_many(
+                [item["link"] for item in pool if is_google_news_url(item["link"])]
+            )
+            return self._select_trending(pool, resolved, limit)
         except Exception as e:
+            record_error(e)
             print(f"Error fetching trending news: {e}")
             return []
 
-    def fetch_market_data(self):
+    @staticmethod
+    def _select_trending(pool, resolved, limit):
         """
-        Fetch current market data for key indices.
-        Returns: Dict of {symbol: {price, change_percent}}
+        Swap resolved publisher links in and drop stories that cannot be scraped.
         """
-        tickers = {
-            "^GSPC": "S&P 500",
-            "^IXIC": "Nasdaq",
-            "^TWII": "台灣加權",
-            "BTC-USD": "Bitcoin"
-        }
-        data = {}
+        news_items = []
+
+        # Blocked domains that are hard to scrape or require login
+        blocked_domains = ["facebook.com", "twitter.com", "instagram.com", "youtube.com", "login"]
+
+        for item in pool:
+            if item["link"] in resolved:
+                if not resolved[item["link"]]:
+                    continue
+                item = {**item, "link": resolved[item["link"]], "google_link": item["link"]}
+
+            # Check if link contains any blocked domain
+            if any(domain in item["link"].lower() for domain in blocked_domains):
+                continue
+
+            news_items.append(item)
+
+            if len(news_items) >= limit:
+                break
+
+        return news_items
+
+    def get_news_poller(self):
+        """
+        Start (once per process) and return the background poller that refreshes the
+        trending pool every NEWS_POLL_INTERVAL seconds.
+        """
+        global _news_poller
+        with _news_poller_lock:
+            if _news_poller is None:
+                _news_poller = NewsPoller(
+                    lambda: self.fetch_trending_news(limit=NEWS_POOL_SIZE),
+                    interval=NEWS_POLL_INTERVAL
+                ).start()
+            return _news_poller
+
+    def get_trending_news(self, limit=20, timeout=15):
+        """
+        Read the trending pool from the shared in-process store without touching the network.
+        Only the very first call after startup waits (up to `timeout` seconds) for the initial poll.
+        Returns: (version, list of news dicts)
+        """
+        store = self.get_news_poller().store
+        store.wait_until_ready(timeout)
+        version, items, _ = store.snapshot()
+        return version, items[:limit]
+
+    @instrumented("market_data")
+    def fetch_market_data(self, watchlist=None):
+        """
+        Fetch current market data for the watchlist (or another {symbol: name} dict,
+        e.g. the canonical tickers of an analyzed article).
+        Results are cached process-wide for MARKET_DATA_TTL seconds, and concurrent
+        requests for the same watchlist share one download; different watchlists
+        download in parallel (the lock only guards the cache dict).
+        Returns: Dict of {name: {price, change_percent}}
+        """
+        watchlist = dict(watchlist or self.watchlist)
+        cache_key = tuple(watchlist.items())
+        with _market_data_lock:
+            cached = _market_data_cache.get(cache_key)
+        if cached and time.time() - cached[0] < MARKET_DATA_TTL:
+            annotate(cache="hit")
+            return copy.deepcopy(cached[1])
+        return _in_flight.do(("market_data", cache_key), self._refresh_market_data, cache_key, watchlist)
+
+    def _refresh_market_data(self, cache_key, watchlist):
+        data = self._download_market_data(watchlist)
+        # Don't keep failed fetches around for the whole TTL
+        if data:
+            with _market_data_lock:
+                # Per-article ticker lists make many keys; drop the expired ones
+                now = time.time()
+                for key in [k for k, (fetched_at, _) in _market_data_cache.items() if now - fetched_at >= MARKET_DATA_TTL]:
+                    del _market_data_cache[key]
+                _market_data_cache[cache_key] = (now, data)
+        return copy.deepcopy(data)
+
+    def _download_market_data(self, watchlist=None):
+        """
+        Download recent daily closes for all watchlist symbols in one batched request
+        and compute the change from the previous close with vectorized pandas operations.
+        """
+        watchlist = watchlist or self.watchlist
+        symbols = list(watchlist)
         try:
-            for symbol, name in tickers.items():
-                ticker = yf.Ticker(symbol)
-                # Get fast info first (faster than history)
-                info = ticker.fast_info
-                if info and info.last_price:
-                    price = info.last_price
-                    prev_close = info.previous_close
-                    change_percent = ((price - prev_close) / prev_close) * 100
-                    data[name] = {
-                        "price": price,
-                        "change_percent": change_percent
-                    }
-            return data
+            frame = yf.download(
+                symbols, period="5d", interval="1d", group_by="column",
+                auto_adjust=False, progress=False, threads=True
+            )
+            if frame is None or frame.empty:
+                return {}
+            closes = frame["Close"]
+            if isinstance(closes, pd.Series):
+                closes = closes.to_frame(symbols[0])
+
+            # Markets close on different days (BTC trades on weekends), so take each
+            # symbol's last and second-to-last valid close rather than the last two rows
+            valid = closes.notna()
+            rank_from_end = valid[::-1].cumsum()[::-1].where(valid)
+            price = closes.where(rank_from_end == 1).max()
+            prev_close = closes.where(rank_from_end == 2).max()
+            change_percent = (price - prev_close) / prev_close * 100
+
+            quotes = pd.DataFrame({"price": price, "change_percent": change_percent}).dropna()
+            return {
+                watchlist[symbol]: {
+                    "price": float(row.price),
+                    "change_percent": float(row.change_percent)
+                }
+                for symbol, row in quotes.reindex([s for s in symbols if s in quotes.index]).iterrows()
+            }
         except Exception as e:
+            record_error(e)
             print(f"Error fetching market data: {e}")
             return {}
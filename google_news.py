@@ -0,0 +1,168 @@
+import base64
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# news.google.com/rss/articles/<id>, /articles/<id> and /read/<id>
+ARTICLE_URL_PATTERN = re.compile(r"^https?://news\.google\.com/(?:rss/)?(?:articles|read)/([A-Za-z0-9_-]+)")
+
+
+def is_google_news_url(url):
+    return bool(ARTICLE_URL_PATTERN.match(url or ""))
+
+
+def extract_article_id(url):
+    match = ARTICLE_URL_PATTERN.match(url or "")
+    return match.group(1) if match else None
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while pos < len(data):
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+    raise ValueError("truncated varint")
+
+
+def decode_article_id_offline(article_id):
+    """
+    Decode a Google News article ID without any network call.
+    Older IDs are base64-encoded protobuf messages that embed the publisher URL
+    in a length-delimited field; newer "AU_yqL..." IDs only carry an opaque
+    token and return None (they need decode_article_url_online).
+    """
+    try:
+        data = base64.urlsafe_b64decode(article_id + "=" * (-len(article_id) % 4))
+    except (ValueError, TypeError):
+        return None
+
+    # Walk the top-level protobuf fields looking for a string that is a URL
+    pos = 0
+    try:
+        while pos < len(data):
+            key, pos = _read_varint(data, pos)
+            wire_type = key & 0x07
+            if wire_type == 0:
+                _, pos = _read_varint(data, pos)
+            elif wire_type == 2:
+                length, pos = _read_varint(data, pos)
+                value = data[pos:pos + length]
+                pos += length
+                if value.startswith((b"http://", b"https://")):
+                    return value.decode("utf-8", errors="ignore")
+            elif wire_type == 5:
+                pos += 4
+            elif wire_type == 1:
+                pos += 8
+            else:
+                break
+    except ValueError:
+        pass
+
+    # Malformed framing: fall back to scanning the raw bytes
+    match = re.search(rb"https?://[\x21-\x7e]+", data)
+    return match.group(0).decode("ascii") if match else None
+
+
+def decode_article_url_online(url, interval=0):
+    """
+    Resolve a Google News URL through googlenewsdecoder (one HTTP round trip).
+    Returns the publisher URL or None.
+    """
+    try:
+        from googlenewsdecoder import new_decoderv1
+    except ImportError as e:
+        print(f"googlenewsdecoder is unavailable: {e}")
+        return None
+    result = new_decoderv1(url, interval=interval)
+    if isinstance(result, dict) and result.get("status"):
+        return result.get("decoded_url")
+    return None
+
+
+class GoogleNewsResolver:
+    """
+    Maps Google News article links to publisher URLs.
+    Lookup order: persistent cache (article ID -> URL), offline base64/protobuf decoding,
+    then network decoding of the remaining links with bounded concurrency.
+    IDs the network could not resolve are remembered in failure_cache (give it a short
+    TTL) and reported as unresolvable without another round trip until they expire.
+    """
+
+    def __init__(self, cache=None, max_workers=4, interval=0, failure_cache=None):
+        self.cache = cache
+        self.failure_cache = failure_cache
+        self.max_workers = max_workers
+        self.interval = interval
+        self.network_calls = 0
+
+    def _remember(self, article_id, resolved):
+        if self.cache is not None and resolved:
+            self.cache.set(article_id, resolved)
+
+    def _remember_failure(self, article_id):
+        if self.failure_cache is not None:
+            self.failure_cache.set(article_id, True)
+
+    def _failed_recently(self, article_id):
+        return self.failure_cache is not None and self.failure_cache.get(article_id) is not None
+
+    def _resolve_local(self, url):
+        """
+        Resolve without the network; returns (article_id, resolved URL or None).
+        """
+        article_id = extract_article_id(url)
+        if article_id is None:
+            return None, url
+        if self.cache is not None:
+            cached = self.cache.get(article_id)
+            if cached:
+                return article_id, cached
+        resolved = decode_article_id_offline(article_id)
+        self._remember(article_id, resolved)
+        return article_id, resolved
+
+    def _resolve_online(self, url):
+        self.network_calls += 1
+        try:
+            return decode_article_url_online(url, interval=self.interval)
+        except Exception as e:
+            print(f"Error resolving Google News link: {e}")
+            return None
+
+    def resolve(self, url):
+        """
+        Returns the publisher URL, the input itself for non-Google links, or None if unresolvable.
+        """
+        return self.resolve_many([url]).get(url)
+
+    def resolve_many(self, urls):
+        """
+        Resolve a batch of links; only IDs that are neither cached, decodable offline
+        nor recently failed hit the network, at most max_workers at a time.
+        Returns: dict {url: publisher URL or None}
+        """
+        resolved = {}
+        pending = {}
+        for url in dict.fromkeys(urls):
+            article_id, target = self._resolve_local(url)
+            if target or article_id is None:
+                resolved[url] = target
+            elif self._failed_recently(article_id):
+                resolved[url] = None
+            else:
+                pending[url] = article_id
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for url, target in zip(pending, executor.map(self._resolve_online, pending)):
+                    if target:
+                        self._remember(pending[url], target)
+                    else:
+                        self._remember_failure(pending[url])
+                    resolved[url] = target
+        return resolved
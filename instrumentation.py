@@ -0,0 +1,268 @@
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Append every recorded span as one JSON line to this file (disabled when unset)
+EVENT_LOG_PATH = os.getenv("ANALYZER_EVENT_LOG")
+# Recent spans kept in memory for inspection
+EVENT_HISTORY = int(os.getenv("ANALYZER_EVENT_HISTORY", 1000))
+
+# Innermost open span and the per-request trace of the current context.
+# Thread pools do not inherit context variables; submit work through
+# contextvars.copy_context().run so spans from worker threads join the trace.
+_current_span = contextvars.ContextVar("analyzer_span", default=None)
+_current_trace = contextvars.ContextVar("analyzer_trace", default=None)
+
+COUNTED_FIELDS = ("bytes", "prompt_tokens", "completion_tokens")
+# Worker threads may annotate a shared parent span concurrently
+_annotate_lock = threading.Lock()
+
+
+class Trace:
+    """
+    Spans recorded while handling one request (e.g. one dashboard analysis),
+    including those from worker threads that run in a copy of the request's context.
+    """
+
+    def __init__(self, name=""):
+        self.name = name
+        self.events = []
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def totals(self):
+        """
+        Returns: dict {duration_ms, bytes, prompt_tokens, completion_tokens, cache_hits, errors}
+        """
+        with self._lock:
+            events = list(self.events)
+        totals = {field: sum(e[field] for e in events) for field in COUNTED_FIELDS}
+        totals["duration_ms"] = round((time.time() - self.started) * 1000, 1)
+        totals["cache_hits"] = sum(e["cache"] == "hit" for e in events)
+        totals["errors"] = sum(bool(e["error"]) for e in events)
+        return totals
+
+
+class Instrumentation:
+    """
+    Collects per-stage spans (duration, bytes, token usage, cache result, error class)
+    and aggregates them into Prometheus-style counters. Spans can also be appended
+    to a JSON-lines event log and are attached to the active request Trace.
+    """
+
+    def __init__(self, event_log=EVENT_LOG_PATH, history=EVENT_HISTORY):
+        self.event_log = event_log
+        self.recent = deque(maxlen=history)
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_span(stage):
+        parent = _current_span.get()
+        return {
+            "stage": stage, "parent": parent["stage"] if parent else None,
+            "bytes": 0, "prompt_tokens": 0, "completion_tokens": 0, "cache": None, "error": None
+        }
+
+    @contextmanager
+    def span(self, stage):
+        span = self.new_span(stage)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = span["error"] or type(e).__name__
+            raise
+        finally:
+            span["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            _current_span.reset(token)
+            self.emit(span)
+
+    @contextmanager
+    def trace(self, name=""):
+        """
+        Collect the spans of one request: `with instrumentation.trace() as trace: ...`
+        """
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        finally:
+            _current_trace.reset(token)
+
+    def _count(self, name, labels, value):
+        key = (name, tuple(sorted(labels.items())))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def emit(self, span):
+        event = dict(span, ts=round(time.time(), 3))
+        stage = {"stage": span["stage"]}
+        with self._lock:
+            self._count("analyzer_stage_calls_total", stage, 1)
+            self._count("analyzer_stage_seconds_total", stage, span["duration_ms"] / 1000)
+            if span["bytes"]:
+                self._count("analyzer_download_bytes_total", stage, span["bytes"])
+            for kind in ("prompt", "completion"):
+                if span[f"{kind}_tokens"]:
+                    self._count("analyzer_llm_tokens_total", dict(stage, kind=kind), span[f"{kind}_tokens"])
+            if span["cache"]:
+                self._count("analyzer_cache_lookups_total", dict(stage, result=span["cache"]), 1)
+            if span["error"]:
+                self._count("analyzer_errors_total", dict(stage, error=span["error"]), 1)
+            self.recent.append(event)
+            if self.event_log:
+                with open(self.event_log, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(event)
+
+    def to_prometheus(self):
+        """
+        Counters in the Prometheus text exposition format.
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+        lines = []
+        seen = set()
+        for (name, labels), value in counters:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# TYPE {name} counter")
+            label_text = ",".join(f'{key}="{value_}"' for key, value_ in labels)
+            lines.append(f"{name}{{{label_text}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def annotate(**values):
+    """
+    Add to the innermost open span: bytes / token counts accumulate, other fields are set.
+    """
+    span = _current_span.get()
+    if span is None:
+        return
+    with _annotate_lock:
+        for key, value in values.items():
+            if key in COUNTED_FIELDS:
+                span[key] += value or 0
+            else:
+                span[key] = value
+
+
+def record_usage(response):
+    """
+    Add the prompt/completion token usage reported with an OpenAI response.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        annotate(prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                 completion_tokens=getattr(usage, "completion_tokens", 0) or 0)
+
+
+def record_error(error):
+    """
+    Mark the innermost span with the error class of a handled exception.
+    """
+    span = _current_span.get()
+    if span is not None and not span["error"]:
+        span["error"] = type(error).__name__
+
+
+def propagate(func):
+    """
+    Bind func to a copy of the caller's context (open span and trace) for executor.submit.
+    Create one per submitted task: a context can only be entered by one thread at a time.
+    """
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation():
+    return _instrumentation
+
+
+def instrumented(stage):
+    """
+    Decorator recording a span for every call; generator functions are timed until exhausted.
+    Coroutine functions and async generators are supported as well.
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                span = _instrumentation.new_span(stage)
+                start = time.perf_counter()
+                generator = func(*args, **kwargs)
+                try:
+                    while True:
+                        # The consumer may resume us from another context, so enter the span per step
+                        token = _current_span.set(span)
+                        try:
+                            item = next(generator)
+                        except StopIteration:
+                            break
+                        except Exception as e:
+                            span["error"] = span["error"] or type(e).__name__
+                            raise
+                        finally:
+                            _current_span.reset(token)
+                        yield item
+                finally:
+                    generator.close()
+                    span["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                    _instrumentation.emit(span)
+            return generator_wrapper
+
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def async_generator_wrapper(*args, **kwargs):
+                span = _instrumentation.new_span(stage)
+                start = time.perf_counter()
+                generator = func(*args, **kwargs)
+                try:
+                    while True:
+                        token = _current_span.set(span)
+                        try:
+                            item = await generator.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        except Exception as e:
+                            span["error"] = span["error"] or type(e).__name__
+                            raise
+                        finally:
+                            _current_span.reset(token)
+                        yield item
+                finally:
+                    await generator.aclose()
+                    span["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+                    _instrumentation.emit(span)
+            return async_generator_wrapper
+
+        if inspect.iscoroutinefunction(func):
+            # Each asyncio task runs in its own copy of the context, so concurrent spans don't mix
+            @functools.wraps(func)
+            async def coroutine_wrapper(*args, **kwargs):
+                with _instrumentation.span(stage):
+                    return await func(*args, **kwargs)
+            return coroutine_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _instrumentation.span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,115 @@
+import bisect
+import os
+import re
+
+# Which local model model_provider="local" uses: "lexicon" (no dependencies) or "finbert"
+LOCAL_SENTIMENT_MODEL = os.getenv("LOCAL_SENTIMENT_MODEL", "lexicon")
+FINBERT_MODEL_NAME = os.getenv("FINBERT_MODEL_NAME", "ProsusAI/finbert")
+
+# Compact finance sentiment lexicon (English terms in the spirit of Loughran-McDonald, plus zh-TW terms)
+POSITIVE_TERMS = [
+    "beat", "beats", "surge", "surged", "soar", "soared", "rally", "rallied", "gain", "gains", "gained",
+    "record", "growth", "grew", "profit", "profitable", "upgrade", "upgraded", "outperform", "bullish",
+    "strong", "stronger", "robust", "rebound", "rebounded", "exceed", "exceeded", "raise", "raised",
+    "boost", "boosted", "optimistic", "expansion", "higher", "jump", "jumped", "climb", "climbed", "buyback",
+    "上漲", "大漲", "漲停", "創新高", "新高", "成長", "增長", "獲利", "盈餘成長", "優於預期", "超出預期",
+    "看好", "樂觀", "利多", "買超", "調升", "上調", "反彈", "強勁", "熱銷", "擴產", "配息", "回購", "突破"
+]
+NEGATIVE_TERMS = [
+    "miss", "missed", "plunge", "plunged", "tumble", "tumbled", "slump", "slumped", "drop", "dropped",
+    "fall", "fell", "loss", "losses", "decline", "declined", "downgrade", "downgraded", "underperform",
+    "bearish", "weak", "weaker", "lawsuit", "investigation", "layoff", "layoffs", "cut", "cuts", "recession",
+    "default", "bankruptcy", "warning", "warns", "lower", "slowdown", "fraud", "selloff", "sell-off", "risk",
+    "下跌", "大跌", "跌停", "重挫", "暴跌", "新低", "衰退", "虧損", "低於預期", "不如預期", "看壞", "悲觀",
+    "利空", "賣超", "調降", "下修", "裁員", "違約", "破產", "警訊", "疲弱", "減產", "停工", "調查", "風險"
+]
+# Negation words ("不斷", "不少", "不過"... are not negations)
+NEGATIONS = re.compile(r"\b(?:not|no|never|without|fails? to)\b|(?:並未|沒有|不|未)(?!斷|僅|但|只|少|過)", re.I)
+# What may stand between a negation and the term it negates: up to two words or two CJK
+# characters, no punctuation ("did not beat", "not a strong", "沒有明顯上漲")
+NEGATION_GAP = re.compile(r"(?:\s*[a-z]+){0,2}\s*|[\u4e00-\u9fff]{0,2}", re.I)
+
+
+class LexiconSentimentModel:
+    """
+    Dependency-free lexicon scorer for English and Chinese financial text.
+    All terms are matched with one precompiled regex, so scoring a headline takes microseconds.
+    """
+
+    def __init__(self, positive=POSITIVE_TERMS, negative=NEGATIVE_TERMS, neutral_band=0.15):
+        self.polarity = {term.lower(): 1 for term in positive}
+        self.polarity.update({term.lower(): -1 for term in negative})
+        self.neutral_band = neutral_band
+        # Longest terms first so "創新高" wins over "新高"; English terms need word boundaries
+        terms = sorted(self.polarity, key=len, reverse=True)
+        alternatives = [
+            re.escape(term) if not term.isascii() else rf"\b{re.escape(term)}\b" for term in terms
+        ]
+        self.pattern = re.compile("|".join(alternatives), re.I)
+
+    def predict(self, text):
+        """
+        Returns: (label, score) with score the 0.0-1.0 strength of the sentiment.
+        """
+        negation_ends = [m.end() for m in NEGATIONS.finditer(text)]
+        total = 0
+        hits = 0
+        previous_end = 0
+        for match in self.pattern.finditer(text):
+            sign = self.polarity[match.group(0).lower()]
+            # A negation only flips the first term right after it
+            i = bisect.bisect_right(negation_ends, match.start()) - 1
+            if (i >= 0 and negation_ends[i] >= previous_end
+                    and NEGATION_GAP.fullmatch(text, negation_ends[i], match.start())):
+                sign = -sign
+            previous_end = match.end()
+            total += sign
+            hits += 1
+        if not hits:
+            return "neutral", 0.0
+        net = total / (hits + 1)
+        if net > self.neutral_band:
+            return "positive", round(min(1.0, abs(net)), 4)
+        if net < -self.neutral_band:
+            return "negative", round(min(1.0, abs(net)), 4)
+        return "neutral", round(1.0 - abs(net), 4)
+
+    def predict_batch(self, texts):
+        return [self.predict(text) for text in texts]
+
+
+class FinBertSentimentModel:
+    """
+    FinBERT (ProsusAI/finbert) through transformers, run on CPU in batches.
+    Requires the optional transformers + torch dependencies.
+    """
+
+    def __init__(self, model_name=FINBERT_MODEL_NAME, batch_size=32):
+        from transformers import pipeline
+
+        self.batch_size = batch_size
+        self.pipeline = pipeline(
+            "text-classification", model=model_name, device=-1, truncation=True, max_length=512
+        )
+
+    def predict_batch(self, texts):
+        outputs = self.pipeline(list(texts), batch_size=self.batch_size)
+        return [(output["label"].lower(), round(float(output["score"]), 4)) for output in outputs]
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+
+def load_sentiment_model(name=LOCAL_SENTIMENT_MODEL):
+    """
+    Instantiate a local sentiment model by name; "finbert" falls back to the
+    lexicon model when transformers is not installed.
+    """
+    if name == "finbert":
+        try:
+            return FinBertSentimentModel()
+        except ImportError as e:
+            print(f"FinBERT unavailable ({e}), using the lexicon sentiment model")
+    elif name != "lexicon":
+        raise ValueError(f"Unknown local sentiment model: {name}")
+    return LexiconSentimentModel()
@@ -0,0 +1,211 @@
+import calendar
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+import feedparser
+
+# Feeds merged into the trending pool
+DEFAULT_FEEDS = [
+    {"name": "Yahoo Finance", "url": "https://finance.yahoo.com/news/rssindex"},
+    {"name": "CNBC", "url": "https://www.cnbc.com/id/100003114/device/rss/rss.html"},
+    {"name": "Google 新聞", "url": "https://news.google.com/rss/search?q=finance+when:1d&hl=zh-TW&gl=TW&ceid=TW:zh-Hant"}
+]
+if os.getenv("NEWS_FEEDS"):
+    DEFAULT_FEEDS = [
+        {"name": urlparse(url).netloc, "url": url}
+        for url in (part.strip() for part in os.getenv("NEWS_FEEDS").split(","))
+        if url
+    ]
+
+# Query parameters that never change which article a URL points to
+TRACKING_PARAMS = re.compile(r"^(utm_\w+|guccounter|guce_\w+|ncid|fbclid|gclid|cmpid|oc|ref|src|\.tsrc)$", re.I)
+
+# Two headlines sharing at least this fraction of shingles are treated as the same story
+TITLE_SIMILARITY_THRESHOLD = 0.6
+
+
+def normalize_url(url):
+    """
+    Canonical form of an article URL for de-duplication: no scheme, "www.",
+    fragment, trailing slash or tracking parameters.
+    """
+    parts = urlparse(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query) if not TRACKING_PARAMS.match(k)))
+    return urlunparse(("", host, parts.path.rstrip("/"), "", query, ""))
+
+
+def title_shingles(title, size=3):
+    """
+    Character shingles of a normalized headline; character-based so that
+    Chinese headlines (no word boundaries) and English ones are handled alike.
+    """
+    text = re.sub(r"[\W_]+", " ", title.lower()).strip()
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class FeedAggregator:
+    """
+    Fetches several RSS feeds in parallel, revalidating each with ETag / Last-Modified,
+    and merges the entries into one de-duplicated, ranked pool.
+    """
+
+    def __init__(self, feeds=None, session=None, max_workers=8, timeout=10,
+                 title_threshold=TITLE_SIMILARITY_THRESHOLD):
+        self.feeds = feeds or DEFAULT_FEEDS
+        self.session = session
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.title_threshold = title_threshold
+        # Per-feed {etag, last_modified, entries} from the last successful fetch
+        self._feed_state = {}
+        self._lock = threading.Lock()
+
+    def fetch_feed(self, feed):
+        """
+        Fetch one feed, returning the previous entries unchanged on 304 Not Modified.
+        Returns: list of dicts {title, link, published, published_ts, source}
+        """
+        url = feed["url"]
+        if self.session is None:
+            with self._lock:
+                state = self._feed_state.get(url, {})
+            parsed = feedparser.parse(url, etag=state.get("etag"), modified=state.get("last_modified"))
+            if parsed.get("status") == 304:
+                return state.get("entries", [])
+            return self.store_feed(feed, parsed, parsed.get("etag"), parsed.get("modified"))
+
+        response = self.session.get(url, headers=self.conditional_headers(url), timeout=self.timeout)
+        if response.status_code == 304:
+            return self.cached_entries(url)
+        response.raise_for_status()
+        return self.store_feed(
+            feed, feedparser.parse(response.content),
+            response.headers.get("ETag"), response.headers.get("Last-Modified")
+        )
+
+    def conditional_headers(self, url):
+        """
+        If-None-Match / If-Modified-Since headers to revalidate the last fetch of a feed.
+        """
+        with self._lock:
+            state = self._feed_state.get(url, {})
+        headers = {}
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("last_modified"):
+            headers["If-Modified-Since"] = state["last_modified"]
+        return headers
+
+    def cached_entries(self, url):
+        """
+        Entries from the last successful fetch of a feed (empty if there was none).
+        """
+        with self._lock:
+            return self._feed_state.get(url, {}).get("entries", [])
+
+    def store_feed(self, feed, parsed, etag, last_modified):
+        """
+        Convert a feedparser result into entries and remember them with the validators.
+        Also used by callers that download feeds themselves (e.g. with an async client).
+        """
+        url = feed["url"]
+        entries = []
+        for entry in parsed.entries:
+            if not entry.get("link") or not entry.get("title"):
+                continue
+            published_parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+            entries.append({
+                "title": entry.title,
+                "link": entry.link,
+                "published": entry.get("published", entry.get("updated", "")),
+                "published_ts": calendar.timegm(published_parsed) if published_parsed else None,
+                "source": feed.get("name", urlparse(url).netloc)
+            })
+
+        with self._lock:
+            self._feed_state[url] = {"etag": etag, "last_modified": last_modified, "entries": entries}
+        return entries
+
+    def fetch_all(self):
+        """
+        Fetch all feeds concurrently; a failing feed is skipped, not fatal.
+        """
+        def safe_fetch(feed):
+            try:
+                return self.fetch_feed(feed)
+            except Exception as e:
+                print(f"Error fetching feed {feed['url']}: {e}")
+                return self.cached_entries(feed["url"])
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self.feeds)) or 1) as executor:
+            results = executor.map(safe_fetch, self.feeds)
+            return [entry for entries in results for entry in entries]
+
+    def deduplicate(self, entries):
+        """
+        Merge entries with the same normalized URL or a near-duplicate headline.
+        The first copy is kept and records every source that carried the story.
+        """
+        merged = []
+        by_url = {}
+        shingles = []
+        for entry in entries:
+            key = normalize_url(entry["link"])
+            duplicate = by_url.get(key)
+            if duplicate is None:
+                entry_shingles = title_shingles(entry["title"])
+                for i, existing in enumerate(merged):
+                    if jaccard(entry_shingles, shingles[i]) >= self.title_threshold:
+                        duplicate = existing
+                        break
+            if duplicate is not None:
+                if entry["source"] not in duplicate["sources"]:
+                    duplicate["sources"].append(entry["source"])
+                by_url.setdefault(key, duplicate)
+                continue
+
+            item = {**entry, "sources": [entry["source"]]}
+            merged.append(item)
+            shingles.append(entry_shingles)
+            by_url[key] = item
+        return merged
+
+    @staticmethod
+    def rank(items, now=None):
+        """
+        Rank stories by how many feeds carry them, then by recency.
+        """
+        now = now or time.time()
+
+        def score(item):
+            age_hours = (now - item["published_ts"]) / 3600 if item.get("published_ts") else 24
+            return len(item["sources"]) + 1 / (1 + max(age_hours, 0) / 6)
+
+        return sorted(items, key=score, reverse=True)
+
+    def get_pool(self):
+        """
+        Returns: ranked, de-duplicated list of dicts {title, link, published, published_ts, source, sources}
+        """
+        return self.merge(self.fetch_all())
+
+    def merge(self, entries):
+        """
+        De-duplicate and rank entries fetched from all feeds.
+        """
+        return self.rank(self.deduplicate(entries))
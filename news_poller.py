@@ -0,0 +1,100 @@
+import threading
+import time
+
+
+class NewsStore:
+    """
+    Thread-safe, versioned in-memory snapshot of the trending news pool.
+    Readers never block on the network; the version increases whenever the pool changes.
+    """
+
+    def __init__(self):
+        self._items = []
+        self._version = 0
+        self._updated_at = None
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+
+    def update(self, items):
+        """
+        Replace the pool; returns True if it changed. Empty results keep the previous pool.
+        """
+        if not items:
+            return False
+        with self._lock:
+            self._updated_at = time.time()
+            if [i["link"] for i in items] == [i["link"] for i in self._items]:
+                return False
+            self._items = list(items)
+            self._version += 1
+        return True
+
+    def mark_ready(self):
+        """
+        Release cold-start waiters; called after the first poll attempt, whether or not it found news.
+        """
+        self._ready.set()
+
+    def snapshot(self):
+        """
+        Returns: (version, items, updated_at)
+        """
+        with self._lock:
+            return self._version, list(self._items), self._updated_at
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Block until the first poll attempt has finished (cold start only); returns whether it has.
+        Once set this never blocks again, so failing feeds cost at most one wait per process.
+        """
+        return self._ready.wait(timeout)
+
+
+class NewsPoller:
+    """
+    Background daemon thread that calls fetch() every `interval` seconds and
+    publishes the result to a NewsStore, so outbound feed traffic stays constant
+    however many sessions read the pool.
+    """
+
+    def __init__(self, fetch, interval=300, store=None):
+        self.fetch = fetch
+        self.interval = interval
+        self.store = store or NewsStore()
+        self.last_error = None
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name="news-poller", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
+
+    def refresh_now(self):
+        """
+        Wake the poller for an immediate refresh instead of waiting for the next interval.
+        """
+        self._wakeup.set()
+
+    def poll_once(self):
+        try:
+            self.store.update(self.fetch())
+            self.last_error = None
+        except Exception as e:
+            self.last_error = e
+            print(f"Error polling news feeds: {e}")
+        finally:
+            self.store.mark_ready()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self.poll_once()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# A hit refreshes accessed_at (for LRU eviction) only if the stored time is older than this,
+# so hot keys don't turn every read into a write transaction
+CACHE_TOUCH_INTERVAL = 60.0
+# Sizes are checked once per this fraction of max_entries sets rather than with COUNT(*) on every set
+CACHE_EVICT_FRACTION = 0.05
+
+
+def make_cache_key(*parts):
+    """
+    Build a stable content-addressed key from JSON-serialisable parts.
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def normalize_text(text):
+    """
+    Collapse whitespace so trivially different copies of an article hash the same.
+    """
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+class ResultCache:
+    """
+    Persistent key/value cache backed by SQLite.
+    Values are stored as JSON, entries expire after `ttl` seconds and the
+    least recently used entries are evicted once `max_entries` is exceeded
+    (checked every few sets, so the table may briefly run CACHE_EVICT_FRACTION over).
+    """
+
+    def __init__(self, path, namespace="results", ttl=None, max_entries=None, touch_interval=CACHE_TOUCH_INTERVAL):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.touch_interval = touch_interval
+        self._evict_every = max(1, int((max_entries or 0) * CACHE_EVICT_FRACTION))
+        self._sets = 0
+        # Namespaces map to tables, so several caches can share one file
+        self.table = "cache_" + re.sub(r"\W", "_", namespace)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_accessed ON {self.table} (accessed_at)"
+            )
+            self._conn.commit()
+
+    def get(self, key, default=None):
+        """
+        Return the cached value for `key`, or `default` if missing or expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at, accessed_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                if row is not None:
+                    self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return default
+            if now - row[2] >= self.touch_interval:
+                self._conn.execute(
+                    f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        """
+        Store a JSON-serialisable value; every few sets, evict LRU entries beyond max_entries.
+        """
+        now = time.time()
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, payload, now, now)
+            )
+            self._sets += 1
+            if self.max_entries is not None and self._sets % self._evict_every == 0:
+                count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        f"DELETE FROM {self.table} WHERE key IN ("
+                        f"SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self):
+        """
+        Returns: dict {hits, misses, hit_rate, size}
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "size": len(self)
+        }
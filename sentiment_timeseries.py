@@ -0,0 +1,277 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+SENTIMENT_TIMESERIES_PATH = os.getenv("SENTIMENT_TIMESERIES_PATH", os.path.join(".cache", "sentiment_timeseries"))
+# Buffered observations are written as a new Parquet part once this many accumulate,
+# or once the oldest has waited TIMESERIES_FLUSH_SECONDS (reads include the buffer either way)
+TIMESERIES_FLUSH_ROWS = int(os.getenv("TIMESERIES_FLUSH_ROWS", "50"))
+TIMESERIES_FLUSH_SECONDS = float(os.getenv("TIMESERIES_FLUSH_SECONDS", "300"))
+# Part files are merged into one (in a background thread) when there are more than this many
+TIMESERIES_MAX_PARTS = int(os.getenv("TIMESERIES_MAX_PARTS", "64"))
+
+SCHEMA = pa.schema([
+    ("ts", pa.timestamp("ms", tz="UTC")),
+    ("ticker", pa.string()),
+    ("score", pa.float32()),
+    ("label", pa.string()),
+    ("url", pa.string())
+])
+
+SIGNS = {"positive": 1.0, "negative": -1.0}
+
+
+def signed_score(label, score):
+    """
+    Map (label, strength) onto -1.0 (negative) ... +1.0 (positive); neutral is 0.
+    """
+    return SIGNS.get(label, 0.0) * float(score or 0.0)
+
+
+def latest_rollup(rolled):
+    """
+    The most recent row per ticker of a rollup() result, most-mentioned first.
+    """
+    if rolled.empty:
+        return rolled
+    latest = rolled.groupby(level="ticker").tail(1).reset_index(level="period")
+    return latest.sort_values("rolling_count", ascending=False)
+
+
+def _to_timestamp(value):
+    """
+    UTC pandas Timestamp from epoch seconds, a datetime or a date string.
+    """
+    if isinstance(value, (int, float)):
+        return pd.Timestamp(value, unit="s", tz="UTC")
+    value = pd.Timestamp(value)
+    return value.tz_localize("UTC") if value.tzinfo is None else value.tz_convert("UTC")
+
+
+class SentimentTimeSeries:
+    """
+    Append-only columnar store of per-ticker sentiment observations
+    (a directory of Parquet parts read as one Arrow dataset).
+    Rollups are computed on a ticker x period matrix with vectorized pandas/NumPy
+    operations, so they stay fast at millions of observations.
+    Readers take a snapshot of the part list and buffer under the lock and scan it
+    after releasing it, so a slow scan never blocks record(); if compaction removes a
+    snapshotted part meanwhile, the scan is retried on a fresh snapshot.
+    """
+
+    def __init__(self, path=SENTIMENT_TIMESERIES_PATH, flush_rows=TIMESERIES_FLUSH_ROWS,
+                 max_parts=TIMESERIES_MAX_PARTS, flush_seconds=TIMESERIES_FLUSH_SECONDS):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self.max_parts = max_parts
+        self._buffer = []
+        self._buffered_since = None
+        self._lock = threading.Lock()
+        self._compacting = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        # Don't lose observations still buffered at shutdown
+        atexit.register(self.flush)
+
+    def record(self, tickers, label, score, url=None, ts=None):
+        """
+        Add one observation per ticker for an analyzed article.
+        """
+        tickers = sorted({str(t).strip().upper() for t in tickers or [] if str(t).strip()})
+        if not tickers:
+            return 0
+        ts = _to_timestamp(ts if ts is not None else time.time())
+        value = signed_score(label, score)
+        with self._lock:
+            if not self._buffer:
+                self._buffered_since = time.monotonic()
+            self._buffer.extend((ts, ticker, value, label, url) for ticker in tickers)
+            if (len(self._buffer) >= self.flush_rows
+                    or time.monotonic() - self._buffered_since >= self.flush_seconds):
+                self._flush_locked()
+        return len(tickers)
+
+    def record_many(self, frame):
+        """
+        Bulk append a DataFrame with columns ts, ticker, score (signed), label and optional url.
+        """
+        frame = frame.assign(
+            ts=pd.to_datetime(frame["ts"], utc=True).dt.floor("ms"),
+            ticker=frame["ticker"].astype(str).str.strip().str.upper(),
+            url=frame["url"] if "url" in frame else None
+        )
+        table = pa.Table.from_pandas(frame[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+        with self._lock:
+            self._write_locked(table)
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        table = self._buffer_table()
+        self._buffer = []
+        self._write_locked(table)
+
+    def _buffer_table(self):
+        ts, tickers, scores, labels, urls = zip(*self._buffer)
+        return pa.table({
+            "ts": pa.array(ts, type=SCHEMA.field("ts").type),
+            "ticker": pa.array(tickers, type=pa.string()),
+            "score": pa.array(scores, type=pa.float32()),
+            "label": pa.array(labels, type=pa.string()),
+            "url": pa.array(urls, type=pa.string())
+        }, schema=SCHEMA)
+
+    def _parts(self):
+        return sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path) if name.endswith(".parquet")
+        )
+
+    def _new_part_path(self):
+        return os.path.join(self.path, f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet")
+
+    def _write_locked(self, table):
+        path = self._new_part_path()
+        pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        if len(self._parts()) > self.max_parts and self._compacting.acquire(blocking=False):
+            # Merging rewrites the whole dataset; keep it off the caller's (request) thread
+            threading.Thread(target=self._compact_and_release, name="timeseries-compaction", daemon=True).start()
+
+    def _compact_and_release(self):
+        try:
+            self._compact()
+        finally:
+            self._compacting.release()
+
+    def compact(self):
+        """
+        Merge all part files into a single time-sorted Parquet file.
+        """
+        with self._compacting:
+            self._compact()
+
+    def _compact(self):
+        # Only compaction removes parts and only one runs at a time, so this snapshot stays readable
+        with self._lock:
+            parts = self._parts()
+        if len(parts) <= 1:
+            return
+        table = ds.dataset(parts, schema=SCHEMA, format="parquet").to_table().sort_by("ts")
+        path = self._new_part_path()
+        pq.write_table(table, path + ".tmp", row_group_size=1 << 20)
+        # Swap under the lock: a snapshot lists either the old parts or the merged file, never both or neither
+        with self._lock:
+            os.replace(path + ".tmp", path)
+            for part in parts:
+                os.remove(part)
+
+    def load(self, tickers=None, since=None, columns=("ts", "ticker", "score")):
+        """
+        Observations as a DataFrame; ticker/time filters are pushed down into the Parquet scan.
+        """
+        condition = None
+        if tickers:
+            condition = ds.field("ticker").isin([str(t).upper() for t in tickers])
+        if since is not None:
+            since_filter = ds.field("ts") >= pa.scalar(_to_timestamp(since), type=SCHEMA.field("ts").type)
+            condition = since_filter if condition is None else condition & since_filter
+        while True:
+            buffered, parts = self.snapshot()
+            tables = [buffered.filter(condition) if condition is not None else buffered] if buffered else []
+            try:
+                if parts:
+                    tables.append(ds.dataset(parts, schema=SCHEMA, format="parquet").to_table(filter=condition))
+                break
+            except FileNotFoundError:
+                # Compaction merged the snapshotted parts away; rescan the merged file
+                continue
+        if not tables:
+            return SCHEMA.empty_table().select(list(columns)).to_pandas()
+        return pa.concat_tables(tables).select(list(columns)).to_pandas()
+
+    def snapshot(self):
+        """
+        The buffered observations (an Arrow table, or None) and the current part files.
+        Parts are immutable once written, so the part list plus the buffer size
+        identifies the data: version() is a cheap cache key for rollups.
+        """
+        with self._lock:
+            return (self._buffer_table() if self._buffer else None), tuple(self._parts())
+
+    def version(self):
+        with self._lock:
+            return tuple(os.path.basename(part) for part in self._parts()), len(self._buffer)
+
+    def __len__(self):
+        while True:
+            buffered, parts = self.snapshot()
+            try:
+                stored = ds.dataset(parts, schema=SCHEMA, format="parquet").count_rows() if parts else 0
+                return stored + (buffered.num_rows if buffered else 0)
+            except FileNotFoundError:
+                continue
+
+    def top_tickers(self, n=10, since=None):
+        """
+        Most frequently mentioned tickers, most observations first.
+        """
+        frame = self.load(since=since, columns=("ticker",))
+        if frame.empty:
+            return []
+        return frame["ticker"].value_counts().head(n).index.tolist()
+
+    def rollup(self, tickers=None, freq="1D", window=7, since=None):
+        """
+        Per-ticker sentiment aggregates per `freq` period:
+          count          observations in the period
+          mean           mean signed score in the period
+          rolling_count  observations over the last `window` periods
+          rolling_mean   count-weighted mean over the last `window` periods
+          momentum       rolling_mean minus the rolling_mean `window` periods earlier
+        Returns: long DataFrame indexed by (ticker, period)
+        """
+        frame = self.load(tickers=tickers, since=since)
+        columns = ["count", "mean", "rolling_count", "rolling_mean", "momentum"]
+        if frame.empty:
+            return pd.DataFrame(columns=columns, index=pd.MultiIndex.from_arrays([[], []], names=["ticker", "period"]))
+
+        frame["period"] = frame["ts"].dt.floor(freq)
+        grouped = frame.groupby(["period", "ticker"], observed=True)["score"].agg(["sum", "count"])
+        # Wide period x ticker matrices over a continuous time axis: one rolling pass covers every ticker
+        periods = pd.date_range(grouped.index.levels[0].min(), grouped.index.levels[0].max(), freq=freq)
+        sums = grouped["sum"].unstack("ticker").reindex(periods).fillna(0.0)
+        counts = grouped["count"].unstack("ticker").reindex(periods).fillna(0).astype(np.int64)
+
+        rolling_sums = sums.rolling(window, min_periods=1).sum()
+        rolling_counts = counts.rolling(window, min_periods=1).sum()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts.where(counts > 0)
+            rolling_means = rolling_sums / rolling_counts.where(rolling_counts > 0)
+        momentum = rolling_means - rolling_means.shift(window)
+
+        result = pd.concat({
+            "count": counts, "mean": means, "rolling_count": rolling_counts,
+            "rolling_mean": rolling_means, "momentum": momentum
+        }, axis=1)
+        result.index.name = "period"
+        result = result.stack("ticker", future_stack=True).swaplevel().sort_index()
+        # Drop periods before a ticker's first observation
+        return result[result["rolling_count"] > 0][columns]
+
+    def latest(self, tickers=None, freq="1D", window=7, since=None):
+        """
+        The most recent rollup row per ticker, most-mentioned first.
+        """
+        return latest_rollup(self.rollup(tickers=tickers, freq=freq, window=window, since=since))
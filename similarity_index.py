@@ -0,0 +1,171 @@
+import hashlib
+import itertools
+import os
+import re
+import threading
+
+import numpy as np
+
+from result_cache import normalize_text
+
+# Articles whose 64-bit SimHash fingerprints differ in at most this many bits are treated as copies
+SIMHASH_MAX_DISTANCE = int(os.getenv("SIMHASH_MAX_DISTANCE", 6))
+# Texts with fewer shingles than this are too short to fingerprint reliably (e.g. headlines)
+SIMHASH_MIN_SHINGLES = int(os.getenv("SIMHASH_MIN_SHINGLES", 50))
+# Only the most recently indexed fingerprints are kept (in memory and on disk), like the
+# size-bounded LLM result cache whose entries they point to
+SIMHASH_MAX_ENTRIES = int(os.getenv("SIMHASH_MAX_ENTRIES", 5000))
+SHINGLE_SIZE = 3
+
+# Latin words and single CJK characters, so shingles work for English and Chinese alike
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u3400-\u9fff\uf900-\ufaff]")
+
+# On-disk record: fingerprint + 16-byte content digest
+RECORD_DTYPE = np.dtype([("fingerprint", "<u8"), ("digest", "S16")])
+
+
+def content_digest(text):
+    """
+    16-byte digest of the whitespace-normalized text.
+    """
+    return hashlib.blake2b(normalize_text(text).encode("utf-8"), digest_size=16).digest()
+
+
+def simhash(text, min_shingles=SIMHASH_MIN_SHINGLES):
+    """
+    64-bit SimHash over word / CJK-character 3-gram shingles, or None for short texts.
+    Shingle hashes are combined with a vectorized bit vote.
+    """
+    tokens = TOKEN_PATTERN.findall(normalize_text(text).lower())
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    if len(shingles) < min_shingles:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles)
+    )
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    votes = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    packed = np.packbits((votes > 0).astype(np.uint8), bitorder="little")
+    return int.from_bytes(packed.tobytes(), "little")
+
+
+class SimHashIndex:
+    """
+    Near-duplicate lookup over SimHash fingerprints.
+    Fingerprints live in a growable numpy uint64 array (persisted as an append-only
+    file of fixed-size records). By the pigeonhole principle, two fingerprints within
+    max_distance bits agree exactly on at least one of max_distance + 1 bit bands,
+    so a lookup only compares the few entries sharing a band value instead of scanning
+    the whole index.
+    Once the index grows a quarter past max_entries it is rebuilt (and the file rewritten)
+    with the newest max_entries fingerprints, so pruning costs O(1) amortized per add.
+    """
+
+    def __init__(self, path=None, max_distance=SIMHASH_MAX_DISTANCE, max_entries=SIMHASH_MAX_ENTRIES):
+        self.path = path
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        bands = max_distance + 1
+        bounds = [round(64 * i / bands) for i in range(bands + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._lock = threading.Lock()
+        self._reset()
+        if path and os.path.exists(path):
+            self._load()
+
+    def __len__(self):
+        return len(self.digests)
+
+    def _reset(self):
+        self.buckets = [{} for _ in self.bands]
+        self.fingerprints = np.zeros(1024, dtype=np.uint64)
+        self.digests = []
+
+    def _load(self):
+        records = np.fromfile(self.path, dtype=RECORD_DTYPE)
+        for fingerprint, digest in zip(records["fingerprint"].tolist(), records["digest"].tolist()):
+            # numpy strips trailing NUL bytes from fixed-size byte strings
+            self._insert(fingerprint, digest.ljust(16, b"\0"))
+        if len(self.digests) > self.max_entries:
+            self._prune()
+
+    def _prune(self):
+        """
+        Keep only the newest max_entries fingerprints and rewrite the index file to match.
+        """
+        start = len(self.digests) - self.max_entries
+        fingerprints = self.fingerprints[start:len(self.digests)].tolist()
+        digests = self.digests[start:]
+        self._reset()
+        for fingerprint, digest in zip(fingerprints, digests):
+            self._insert(fingerprint, digest)
+        if self.path:
+            records = np.array(list(zip(fingerprints, digests)), dtype=RECORD_DTYPE)
+            records.tofile(self.path + ".tmp")
+            os.replace(self.path + ".tmp", self.path)
+
+    def _insert(self, fingerprint, digest):
+        position = len(self.digests)
+        if position == len(self.fingerprints):
+            self.fingerprints = np.concatenate([self.fingerprints, np.zeros_like(self.fingerprints)])
+        self.fingerprints[position] = fingerprint
+        self.digests.append(digest)
+        for buckets, (shift, mask) in zip(self.buckets, self.bands):
+            buckets.setdefault((fingerprint >> shift) & mask, []).append(position)
+
+    def add(self, fingerprint, digest):
+        with self._lock:
+            self._insert(fingerprint, digest)
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "ab") as f:
+                    f.write(np.array([(fingerprint, digest)], dtype=RECORD_DTYPE).tobytes())
+            if len(self.digests) > self.max_entries + self.max_entries // 4:
+                self._prune()
+
+    def query(self, fingerprint):
+        """
+        Returns: (digest, distance) of the closest indexed fingerprint within max_distance, or None
+        """
+        with self._lock:
+            # An entry may sit in several matching buckets; comparing it twice is cheaper than de-duplicating
+            positions = np.fromiter(itertools.chain.from_iterable(
+                buckets.get((fingerprint >> shift) & mask, ()) for buckets, (shift, mask) in zip(self.buckets, self.bands)
+            ), dtype=np.int64)
+            if not len(positions):
+                return None
+            distances = np.bitwise_count(self.fingerprints[positions] ^ np.uint64(fingerprint))
+            best = int(distances.argmin())
+            if distances[best] > self.max_distance:
+                return None
+            return self.digests[positions[best]], int(distances[best])
+
+    def canonical_digest(self, text):
+        """
+        Content digest to key cached analyses by: the digest of a previously indexed
+        near-duplicate if there is one, otherwise the text's own digest (which is indexed).
+        """
+        digest = content_digest(text)
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return digest
+        match = self.query(fingerprint)
+        if match is not None:
+            return match[0]
+        self.add(fingerprint, digest)
+        return digest
+
+
+_similarity_indexes = {}
+_similarity_indexes_lock = threading.Lock()
+
+
+def get_similarity_index(path):
+    """
+    Process-wide SimHashIndex per file, so analyzers sharing a cache also share its index.
+    """
+    with _similarity_indexes_lock:
+        if path not in _similarity_indexes:
+            _similarity_indexes[path] = SimHashIndex(path)
+        return _similarity_indexes[path]
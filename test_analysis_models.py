@@ -0,0 +1,19 @@
+from analysis_models import parse_json_lenient
+
+
+def test_smart_quotes_inside_strings_are_kept():
+    reply = '{"events": ["台積電宣布“擴產”計畫", "其他"], "time_info": "2024"}'
+    assert parse_json_lenient(reply) == {"events": ["台積電宣布“擴產”計畫", "其他"], "time_info": "2024"}
+
+    reply = '{"advice": "He said “buy” now", "sentiment": {"label": "positive", "score": 0.8}}'
+    assert parse_json_lenient(reply)["advice"] == "He said “buy” now"
+
+
+def test_smart_quotes_as_delimiters_are_repaired():
+    reply = '{“label”: “positive”, “score”: 0.7, "note": "說“好”"}'
+    assert parse_json_lenient(reply) == {"label": "positive", "score": 0.7, "note": "說“好”"}
+
+
+def test_fenced_and_truncated_replies():
+    assert parse_json_lenient('```json\n{"label": "negative", "score": 0.4,}\n```') == {"label": "negative", "score": 0.4}
+    assert parse_json_lenient('Sure! {"events": ["A“x”", "B') == {"events": ["A“x”", "B"]}
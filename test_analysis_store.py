@@ -0,0 +1,42 @@
+from analysis_store import AnalysisStore
+
+
+def _results(label="positive", tickers=("2330.TW",)):
+    return {"text": "t", "sentiment": (label, 0.9), "info": {"tickers": list(tickers)}, "advice": None}
+
+
+def test_history_is_scoped_to_its_owner():
+    store = AnalysisStore(":memory:")
+    analysis_id = store.save("alice", "https://example.com/a", _results())
+    assert store.count("bob") == 0
+    assert store.list_recent("bob") == []
+    assert store.get("bob", analysis_id) is None
+    store.update("bob", analysis_id, _results("negative"))
+    assert store.get("alice", analysis_id)["results"]["sentiment"] == ("positive", 0.9)
+
+
+def test_same_url_replaces_the_previous_row():
+    store = AnalysisStore(":memory:")
+    first = store.save("alice", "https://example.com/a", _results())
+    store.save("alice", "https://example.com/b", _results())
+    again = store.save("alice", "https://example.com/a", _results("negative", ("AAPL",)))
+    assert again == first
+    assert store.count("alice") == 2
+    assert [row["url"] for row in store.list_recent("alice")] == ["https://example.com/a", "https://example.com/b"]
+    assert store.count("alice", ticker="AAPL") == 1
+    assert store.count("alice", ticker="2330.TW") == 1
+
+
+def test_keyset_pages_cover_every_row_once():
+    store = AnalysisStore(":memory:")
+    for i in range(25):
+        store.save("alice", f"https://example.com/{i}", _results())
+    seen, before = [], None
+    while True:
+        page = store.list_recent("alice", limit=10, before=before)
+        if not page:
+            break
+        seen += [row["url"] for row in page]
+        before = (page[-1]["created_at"], page[-1]["id"])
+    assert len(seen) == 25 and len(set(seen)) == 25
+    assert seen[0] == "https://example.com/24"
@@ -0,0 +1,24 @@
+from entity_index import EntityIndex
+from financial_analyzer import FinancialAnalyzer
+
+
+def test_common_words_are_not_tagged():
+    index = EntityIndex.load()
+    assert index.tag("南亞市場需求強勁，業者發揮創意，政府統一標準") == {}
+    assert index.tag("他吃了一顆蘋果，Dow 提到手臂 Arm 痠痛") == {}
+
+
+def test_ambiguous_aliases_with_company_context_are_tagged():
+    index = EntityIndex.load()
+    assert index.tag("統一股價上漲，南亞(1303)營收成長") == {"1216.TW": 1, "1303.TW": 2}
+    assert index.tag("統一企業公布財報，統一表示將擴產") == {"1216.TW": 2}
+    assert index.tag("台積電與蘋果公司合作") == {"2330.TW": 1, "AAPL": 1}
+
+
+def test_unconfirmed_candidates_are_not_merged():
+    analyzer = FinancialAnalyzer(api_key="sk-test", cache=False, fetch_cache=False)
+    tagged = ["2330.TW", "1216.TW"]
+    info = {"company_name": ["台積電"], "stock_code": ["2330"], "financial_data": {}, "events": [], "time_info": "", "tickers": []}
+    merged = analyzer._merge_entities(info, tagged)
+    assert merged["tickers"] == ["2330.TW"]
+    assert "統一" not in merged["company_name"]
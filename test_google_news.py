@@ -0,0 +1,20 @@
+import google_news
+from google_news import GoogleNewsResolver
+from result_cache import ResultCache
+
+# A new-style ID: opaque token that can't be decoded offline
+LINK = "https://news.google.com/rss/articles/AU_yqLN0dGVzdA"
+
+
+def test_failed_ids_are_not_retried_until_the_failure_expires(monkeypatch):
+    monkeypatch.setattr(google_news, "decode_article_url_online", lambda url, interval=0: None)
+    failures = ResultCache(":memory:", namespace="failed", ttl=60)
+    resolver = GoogleNewsResolver(cache=ResultCache(":memory:"), failure_cache=failures)
+    assert resolver.resolve(LINK) is None
+    assert resolver.resolve(LINK) is None
+    assert resolver.network_calls == 1
+
+    failures.ttl = -1
+    monkeypatch.setattr(google_news, "decode_article_url_online", lambda url, interval=0: "https://example.com/a")
+    assert resolver.resolve(LINK) == "https://example.com/a"
+    assert resolver.network_calls == 2
@@ -0,0 +1,16 @@
+from local_sentiment import LexiconSentimentModel
+
+
+def test_negation_only_flips_the_following_term():
+    model = LexiconSentimentModel()
+    assert model.predict("台積電股價大漲，市場影響不大")[0] == "positive"
+    assert model.predict("台積電營收未成長")[0] == "negative"
+    assert model.predict("股價沒有明顯上漲")[0] == "negative"
+    assert model.predict("股價不斷上漲")[0] == "positive"
+
+
+def test_english_negation():
+    model = LexiconSentimentModel()
+    assert model.predict("Apple did not beat estimates")[0] == "negative"
+    assert model.predict("Shares rallied; no one expected it")[0] == "positive"
+    assert model.predict("Revenue growth was strong, not weak")[0] == "positive"
@@ -0,0 +1,26 @@
+import time
+
+from news_poller import NewsPoller
+
+
+def test_failed_first_poll_does_not_block_readers():
+    def fetch():
+        raise RuntimeError("feeds down")
+
+    poller = NewsPoller(fetch, interval=60).start()
+    try:
+        assert poller.store.wait_until_ready(5)
+        started = time.monotonic()
+        assert poller.store.wait_until_ready(15)
+        assert time.monotonic() - started < 1
+        assert poller.store.snapshot()[1] == []
+    finally:
+        poller.stop()
+
+
+def test_empty_first_poll_does_not_block_readers():
+    poller = NewsPoller(lambda: [], interval=60).start()
+    try:
+        assert poller.store.wait_until_ready(5)
+    finally:
+        poller.stop()
@@ -0,0 +1,16 @@
+import financial_analyzer
+from financial_analyzer import get_openai_client
+
+
+def test_clients_are_bounded_lru_keyed_by_key_hash(monkeypatch):
+    monkeypatch.setattr(financial_analyzer, "_openai_clients", financial_analyzer.OrderedDict())
+    monkeypatch.setattr(financial_analyzer, "OPENAI_CLIENT_CACHE_SIZE", 2)
+    first = get_openai_client("sk-first")
+    get_openai_client("sk-second")
+    assert get_openai_client("sk-first") is first
+    get_openai_client("sk-third")
+
+    clients = financial_analyzer._openai_clients
+    assert len(clients) == 2
+    assert get_openai_client("sk-first") is first
+    assert not any("sk-" in str(key) for key in clients)
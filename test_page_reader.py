@@ -0,0 +1,40 @@
+import gzip
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from financial_analyzer import FinancialAnalyzer
+from async_analyzer import SyncFinancialAnalyzer
+
+PARAGRAPHS = [f"Paragraph {i}: revenue grew {i} percent." for i in range(400)]
+PAGE = ("<html><body><article>" + "".join(f"<p>{p}</p>" for p in PARAGRAPHS) + "</article></body></html>").encode("utf-8")
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = gzip.compress(PAGE)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_gzip_page_is_not_cut_at_content_length(monkeypatch):
+    # Content-Length is the compressed size; the decompressed page is much larger
+    monkeypatch.setenv("NO_PROXY", ",".join(filter(None, [os.environ.get("NO_PROXY"), "127.0.0.1"])))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GzipHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/article"
+    try:
+        for analyzer_class in (FinancialAnalyzer, SyncFinancialAnalyzer):
+            for extractor in ("auto", "stream"):
+                analyzer = analyzer_class(api_key="sk-test", cache=False, fetch_cache=False, extractor=extractor)
+                text = analyzer.fetch_news_from_url(url)
+                assert PARAGRAPHS[-1] in text, (analyzer_class.__name__, extractor)
+    finally:
+        server.shutdown()
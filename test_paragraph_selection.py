@@ -0,0 +1,38 @@
+from financial_analyzer import _paragraph_score, count_tokens, select_informative_paragraphs
+
+
+def test_boilerplate_words_in_reporting_are_kept():
+    netflix = ("Netflix added 9.3 million paid subscribers in the fourth quarter, bringing the total "
+               "to 260 million, while revenue rose 12.5% to $8.8 billion.")
+    meta = "Meta 第三季廣告營收達 400 億美元，年增 19%，每股盈餘 6.03 美元優於分析師預期，帶動盤後股價上漲。"
+    assert _paragraph_score(netflix, 0, 5) > 0
+    assert _paragraph_score(meta, 0, 5) > 0
+
+
+def test_short_boilerplate_lines_are_dropped():
+    for line in ("Subscribe to our newsletter for the latest market updates today",
+                 "分享到 Facebook 分享到 LINE 延伸閱讀：台股今日盤勢"):
+        assert _paragraph_score(line, 0, 5) == 0.0
+
+
+def test_short_lines_fill_the_budget():
+    text = "\n".join(f"Line {i} rev up {i}%" for i in range(3000))
+    selected = select_informative_paragraphs(text, max_tokens=500)
+    assert selected.startswith("Line 0 rev up 0%\nLine 1 rev up 1%")
+    assert 450 <= count_tokens(selected) <= 500
+
+
+def test_short_chinese_paragraphs_are_ranked():
+    paragraph = "台積電第三季營收年增 36%，毛利率 57.8%。"
+    assert len(paragraph) < 40
+    assert _paragraph_score(paragraph, 0, 5) > 0
+
+    filler = "\n".join(f"首頁{i}" for i in range(2000))
+    selected = select_informative_paragraphs(filler + "\n" + paragraph, max_tokens=200)
+    assert paragraph in selected
+
+
+def test_long_cjk_paragraph_is_cut_by_tokens():
+    text = "台積電營收創新高，" * 2000
+    selected = select_informative_paragraphs(text, max_tokens=300)
+    assert 250 <= count_tokens(selected) <= 300
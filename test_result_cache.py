@@ -0,0 +1,24 @@
+from result_cache import ResultCache
+
+
+def test_hits_touch_accessed_at_only_after_the_interval():
+    cache = ResultCache(":memory:", touch_interval=60)
+    cache.set("a", 1)
+    cache._conn.execute(f"UPDATE {cache.table} SET accessed_at = accessed_at - 30")
+    before = cache._conn.execute(f"SELECT accessed_at FROM {cache.table}").fetchone()[0]
+    assert cache.get("a") == 1
+    assert cache._conn.execute(f"SELECT accessed_at FROM {cache.table}").fetchone()[0] == before
+
+    cache._conn.execute(f"UPDATE {cache.table} SET accessed_at = accessed_at - 60")
+    assert cache.get("a") == 1
+    assert cache._conn.execute(f"SELECT accessed_at FROM {cache.table}").fetchone()[0] > before
+
+
+def test_size_is_trimmed_to_max_entries_every_few_sets():
+    cache = ResultCache(":memory:", max_entries=100)
+    for i in range(104):
+        cache.set(str(i), i)
+    assert len(cache) == 104
+    cache.set("104", 104)
+    assert len(cache) == 100
+    assert cache.get("0") is None and cache.get("104") == 104
@@ -0,0 +1,32 @@
+import pandas as pd
+
+from sentiment_timeseries import SentimentTimeSeries
+
+
+def _frame(n, ticker="2330.TW"):
+    return pd.DataFrame({
+        "ts": pd.date_range("2026-01-01", periods=n, freq="h", tz="UTC"),
+        "ticker": ticker, "score": 0.5, "label": "positive"
+    })
+
+
+def test_version_changes_with_new_observations(tmp_path):
+    series = SentimentTimeSeries(str(tmp_path), flush_rows=100)
+    before = series.version()
+    series.record(["AAPL"], "positive", 0.9)
+    buffered = series.version()
+    assert buffered != before
+    series.flush()
+    assert series.version() not in (before, buffered)
+    assert series.version() == series.version()
+
+
+def test_load_rescans_after_compaction_removed_snapshotted_parts(tmp_path):
+    series = SentimentTimeSeries(str(tmp_path), max_parts=100)
+    series.record_many(_frame(3))
+    series.record_many(_frame(2, "AAPL"))
+    stale = series.snapshot()
+    series.compact()
+    snapshots = iter([stale])
+    series.snapshot = lambda: next(snapshots, None) or SentimentTimeSeries.snapshot(series)
+    assert len(series.load()) == 5
@@ -0,0 +1,23 @@
+import os
+import random
+
+from similarity_index import SimHashIndex
+
+
+def test_index_keeps_only_newest_entries(tmp_path):
+    path = str(tmp_path / "simhash.bin")
+    index = SimHashIndex(path, max_entries=100)
+    rng = random.Random(0)
+    fingerprints = [rng.getrandbits(64) for _ in range(300)]
+    for i, fingerprint in enumerate(fingerprints):
+        index.add(fingerprint, i.to_bytes(16, "little"))
+
+    assert len(index) <= 125
+    assert os.path.getsize(path) == len(index) * 24
+    assert index.query(fingerprints[-1])[0] == (299).to_bytes(16, "little")
+    assert index.query(fingerprints[0]) is None
+
+    reloaded = SimHashIndex(path, max_entries=50)
+    assert len(reloaded) == 50
+    assert os.path.getsize(path) == 50 * 24
+    assert reloaded.query(fingerprints[-1])[0] == (299).to_bytes(16, "little")
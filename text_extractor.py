@@ -0,0 +1,197 @@
+import re
+from html.parser import HTMLParser
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError:  # lxml is optional, the streaming engine needs only the stdlib
+    lxml = None
+
+# Elements whose content is never article text
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "iframe", "nav", "header", "footer", "aside", "form"}
+
+# Elements that usually wrap the main article body, in order of preference
+MAIN_CONTENT_XPATHS = [
+    "//*[@itemprop='articleBody']",
+    "//article",
+    "//main",
+    "//*[@role='main']"
+]
+
+# Elements that end a line of text
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "br", "li", "ul", "ol", "tr", "table",
+    "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "figcaption", "dd", "dt"
+}
+
+# A main-content container with less text than this is treated as a false positive
+MIN_MAIN_CONTENT_CHARS = 200
+
+
+def _clean_lines(lines, max_chars=None):
+    """
+    Strip lines, split multi-headlines on double spaces and drop blanks,
+    stopping once max_chars characters have been collected.
+    """
+    output = []
+    total = 0
+    for line in lines:
+        for phrase in line.split("  "):
+            phrase = re.sub(r"\s+", " ", phrase).strip()
+            if not phrase:
+                continue
+            output.append(phrase)
+            total += len(phrase) + 1
+            if max_chars is not None and total >= max_chars:
+                return output
+    return output
+
+
+def extract_text_bs4(html, max_chars=None):
+    """
+    Original extraction path: full-DOM parse with html.parser and get_text().
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Remove script and style elements
+    for script in soup(["script", "style"]):
+        script.decompose()
+
+    lines = soup.get_text().splitlines()
+    return '\n'.join(_clean_lines(lines, max_chars))
+
+
+def extract_text_lxml(html, max_chars=None):
+    """
+    Parse with lxml, prefer the <article>/<main> container and collect its block text.
+    """
+    if isinstance(html, str):
+        # lxml refuses str input that carries an XML encoding declaration; pin the
+        # encoding so a <meta charset> in the page cannot override it
+        html = html.encode("utf-8")
+    root = lxml.html.fromstring(html, parser=lxml.html.HTMLParser(encoding="utf-8"))
+
+    for element in list(root.iter(*SKIP_TAGS)):
+        element.drop_tree()
+
+    container = root
+    for xpath in MAIN_CONTENT_XPATHS:
+        candidates = root.xpath(xpath)
+        if candidates:
+            best = max(candidates, key=lambda el: len(el.text_content()))
+            if len(best.text_content().strip()) >= MIN_MAIN_CONTENT_CHARS:
+                container = best
+                break
+
+    # Paragraph-level blocks, skipping blocks nested inside one already collected
+    collected = set()
+    lines = []
+    for block in container.iter("p", "h1", "h2", "h3", "h4", "li", "blockquote", "pre"):
+        if any(ancestor in collected for ancestor in block.iterancestors()):
+            continue
+        collected.add(block)
+        lines.append(block.text_content())
+
+    # Pages without paragraph markup fall back to the container's raw text
+    if sum(len(line.strip()) for line in lines) < MIN_MAIN_CONTENT_CHARS:
+        lines = container.text_content().splitlines()
+
+    return '\n'.join(_clean_lines(lines, max_chars))
+
+
+class StreamingTextExtractor(HTMLParser):
+    """
+    SAX-style extractor that can be fed HTML incrementally.
+    Text inside <article>/<main> is preferred over the rest of the page, and
+    `done` becomes True once max_chars of article text have been collected so
+    callers can stop reading the document early.
+    """
+
+    def __init__(self, max_chars=None):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.done = False
+        self._skip_depth = 0
+        # Tag name of the main-content container we are inside, and its nesting depth
+        self._main_tag = None
+        self._main_depth = 0
+        self._page_lines = [[]]
+        self._main_lines = [[]]
+        self._main_chars = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif self._main_tag is None:
+            if tag in ("article", "main") or dict(attrs).get("itemprop") == "articleBody":
+                self._main_tag = tag
+                self._main_depth = 1
+        elif tag == self._main_tag:
+            self._main_depth += 1
+        if tag in BLOCK_TAGS:
+            self._break_line()
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == self._main_tag:
+            self._main_depth -= 1
+            if not self._main_depth:
+                self._main_tag = None
+        if tag in BLOCK_TAGS:
+            self._break_line()
+
+    def handle_data(self, data):
+        if self._skip_depth or self.done:
+            return
+        self._page_lines[-1].append(data)
+        if self._main_tag is not None:
+            self._main_lines[-1].append(data)
+            self._main_chars += len(data)
+            if self.max_chars is not None and self._main_chars >= self.max_chars:
+                self.done = True
+
+    def _break_line(self):
+        if self._page_lines[-1]:
+            self._page_lines.append([])
+        if self._main_lines[-1]:
+            self._main_lines.append([])
+
+    def feed(self, data):
+        if not self.done:
+            super().feed(data)
+
+    def get_text(self):
+        main = ["".join(parts) for parts in self._main_lines]
+        if sum(len(line) for line in main) >= MIN_MAIN_CONTENT_CHARS:
+            lines = main
+        else:
+            lines = ["".join(parts) for parts in self._page_lines]
+        return '\n'.join(_clean_lines(lines, self.max_chars))
+
+
+def extract_text_stream(html, max_chars=None):
+    parser = StreamingTextExtractor(max_chars=max_chars)
+    parser.feed(html)
+    parser.close()
+    return parser.get_text()
+
+
+EXTRACTORS = {
+    "bs4": extract_text_bs4,
+    "stream": extract_text_stream
+}
+if lxml is not None:
+    EXTRACTORS["lxml"] = extract_text_lxml
+
+
+def extract_text(html, engine="auto", max_chars=None):
+    """
+    Extract readable article text from an HTML page.
+    engine: "auto" (lxml when installed, otherwise the streaming parser), "lxml", "stream" or "bs4".
+    """
+    if engine == "auto":
+        engine = "lxml" if "lxml" in EXTRACTORS else "stream"
+    if engine not in EXTRACTORS:
+        raise ValueError(f"Unknown text extractor: {engine} (available: {', '.join(EXTRACTORS)})")
+    return EXTRACTORS[engine](html, max_chars=max_chars)